@@ -0,0 +1,44 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from time import time
+import numpy
+
+from ann_index import ANNIndex
+from factor_store import read_feature_csv
+
+# Recall@k of ANNIndex against exact search, for a range of probe counts
+def benchmark(feature_csv_filepath, k=10, query_count=500, metric='cosine', seed=0):
+    ids, features = read_feature_csv(feature_csv_filepath)
+
+    start_time = time()
+    index = ANNIndex(ids, features, metric=metric, seed=seed)
+    print 'Indexed %d vectors into %d lists in %.2fs' % (len(index), len(index.centroids), time() - start_time)
+
+    queries = index.prepare(features[numpy.random.RandomState(seed).choice(len(features), query_count, replace=False)])
+    exact_vectors = index.prepare(features.astype(numpy.float32))
+
+    # Many movies share (near) identical vectors, so a result counts as a hit when it scores at
+    # least as well as the k-th exact result rather than when its ID is in the exact top k
+    start_time = time()
+    kth_scores = []
+    for query in queries:
+        scores = numpy.dot(exact_vectors, query)
+        kth_scores.append(numpy.partition(-scores, k - 1)[k - 1] * -1)
+    exact_time = (time() - start_time) / query_count
+    print 'Exact search: %.3f ms/query' % (exact_time * 1e3)
+
+    print '%8s %10s %10s %8s' % ('probes', 'recall@%d' % k, 'ms/query', 'speedup')
+    probe_counts = [2**i for i in range(0, 16) if 2**i < len(index.centroids)] + [len(index.centroids)]
+    for probe_count in probe_counts:
+        start_time = time()
+        results = [index.query(query, k, probe_count) for query in queries]
+        query_time = (time() - start_time) / query_count
+
+        hits = 0
+        for i in range(0, query_count):
+            hits += sum(1 for movie_id, score in results[i] if score >= kth_scores[i] - 1e-6)
+        print '%8d %10.3f %10.3f %8.1f' % (probe_count, float(hits) / (k * query_count), query_time * 1e3, exact_time / query_time)
+
+if __name__ == '__main__':
+    benchmark('../data/20k-users/movie_features.csv')
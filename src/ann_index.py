@@ -0,0 +1,103 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+import numpy
+
+class ANNIndex:
+    '''
+    Approximate nearest-neighbour search over latent feature vectors with an inverted file (IVF).
+    Vectors are clustered with k-means; a query scores the centroids, scans only the vectors of the
+    probe_count closest clusters and ranks those exactly. probe_count is the recall/speed knob:
+    probing every cluster is an exact search.
+
+    metric is 'cosine' (vectors are normalized up front) or 'inner_product'.
+    '''
+    def __init__(self, ids, vectors, cluster_count=None, metric='cosine', iterations=20, seed=None, centroids=None):
+        self.metric = metric
+        vectors = self.prepare(numpy.asarray(vectors, dtype=numpy.float32))
+        ids = numpy.asarray(ids, dtype=numpy.int64)
+
+        if centroids is None:
+            if cluster_count is None:
+                cluster_count = max(1, int(numpy.sqrt(len(vectors))))
+            centroids = self.k_means(vectors, cluster_count, iterations, seed)
+        self.centroids = numpy.asarray(centroids, dtype=numpy.float32)
+
+        # Inverted lists in CSR form, the vectors of list c are contiguous
+        assignments = self.assign(vectors)
+        order = numpy.argsort(assignments, kind='mergesort')
+        self.list_indptr = numpy.concatenate(([0], numpy.cumsum(numpy.bincount(assignments, minlength=len(self.centroids)))))
+        self.ids = ids[order]
+        self.vectors = vectors[order]
+
+    def __len__(self):
+        return len(self.ids)
+
+    # New vectors join the list of their nearest centroid; the centroids themselves are not moved
+    def add(self, ids, vectors):
+        vectors = self.prepare(numpy.asarray(vectors, dtype=numpy.float32).reshape(-1, self.vectors.shape[1]))
+        assignments = self.assign(vectors)
+        order = numpy.argsort(assignments, kind='mergesort')
+        positions = self.list_indptr[assignments[order] + 1]
+
+        self.ids = numpy.insert(self.ids, positions, numpy.asarray(ids, dtype=numpy.int64)[order])
+        self.vectors = numpy.insert(self.vectors, positions, vectors[order], axis=0)
+        self.list_indptr[1:] += numpy.cumsum(numpy.bincount(assignments, minlength=len(self.centroids)))
+
+    def prepare(self, vectors):
+        if self.metric == 'cosine':
+            norms = numpy.sqrt(numpy.sum(vectors**2, axis=-1, keepdims=True))
+            return vectors / numpy.maximum(norms, 1e-12)
+        return vectors
+
+    def assign(self, vectors, centroids=None):
+        if centroids is None:
+            centroids = self.centroids
+        # argmin of squared distance, |x|^2 is the same for every centroid
+        distances = numpy.sum(centroids**2, axis=1) - 2 * numpy.dot(vectors, centroids.T)
+        return numpy.argmin(distances, axis=1)
+
+    def k_means(self, vectors, cluster_count, iterations, seed):
+        random_state = numpy.random.RandomState(seed)
+        cluster_count = min(cluster_count, len(vectors))
+        centroids = vectors[random_state.choice(len(vectors), cluster_count, replace=False)].copy()
+        for iteration in range(0, iterations):
+            assignments = self.assign(vectors, centroids)
+            counts = numpy.bincount(assignments, minlength=cluster_count)
+            for k in range(0, vectors.shape[1]):
+                centroids[:, k] = numpy.bincount(assignments, weights=vectors[:, k], minlength=cluster_count)
+
+            # Restart empty clusters on random vectors
+            empty = counts == 0
+            centroids[~empty] /= counts[~empty, None]
+            centroids[empty] = vectors[random_state.choice(len(vectors), numpy.sum(empty))]
+        return centroids
+
+    # Returns up to k (id, score) pairs, best first
+    def query(self, vector, k=10, probe_count=8):
+        vector = self.prepare(numpy.asarray(vector, dtype=numpy.float32))
+        probe_count = min(probe_count, len(self.centroids))
+        distances = numpy.sum(self.centroids**2, axis=1) - 2 * numpy.dot(self.centroids, vector)
+        probes = numpy.argpartition(distances, probe_count - 1)[:probe_count]
+
+        rows = numpy.concatenate([numpy.arange(self.list_indptr[c], self.list_indptr[c + 1]) for c in probes])
+        scores = numpy.dot(self.vectors[rows], vector)
+        k = min(k, len(rows))
+        if k <= 0:
+            return []
+        top = numpy.argpartition(-scores, k - 1)[:k]
+        top = top[numpy.argsort(-scores[top])]
+        return [(str(self.ids[rows[i]]), float(scores[i])) for i in top]
+
+    '''
+    Persistence, conventionally next to the factors as movie_features.ann.npz
+    '''
+    def save(self, filepath):
+        numpy.savez(filepath, metric=self.metric, centroids=self.centroids, ids=self.ids, vectors=self.vectors)
+        return True
+
+    # Rebuilding from the saved centroids only reassigns vectors, no k-means is run
+    @classmethod
+    def load(cls, filepath):
+        archive = numpy.load(filepath)
+        return cls(archive['ids'], archive['vectors'], metric=str(archive['metric']), centroids=archive['centroids'])
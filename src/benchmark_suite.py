@@ -0,0 +1,233 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from rating_matrix import RatingMatrix
+from incremental_svd_trainer import IncrementalSVDTrainer
+from incremental_svd_tester import IncrementalSVDTester
+from k_nearest import KNearest
+from hyperparameter_search import silence_output
+from multiprocessing import Process, Queue
+from argparse import ArgumentParser
+from csv import writer
+from time import time
+import resource
+import tempfile
+import shutil
+import json
+import os
+import numpy
+
+BASELINE_FILEPATH = '../data/benchmark_baseline.json'
+
+# Name => ratings directory, or (user count, movie count, mean ratings per user) of a synthetic set
+SCALES = {
+    '1k-users': '../data/1k-users',
+    'synthetic-2k': (2000, 4000, 100),
+    'synthetic-5k': (5000, 8000, 100),
+    'synthetic-20k': (20000, 20000, 100),
+}
+
+class BenchmarkSuite:
+    '''
+    Times the hot paths of the loader, trainer, tester and KNN on one dataset. Every benchmark runs
+    in its own forked process, so the peak RSS it reports is its own and one benchmark's caches
+    can't speed up the next. Setup (loading, configure) is not part of the timed section.
+    '''
+    BENCHMARKS = ['csv_ingest', 'gradient_descent_iteration', 'tester_fold_in', 'knn_hypothesis', 'knn_rmse']
+
+    def __init__(self, dataset_dir, latent_factor_length=8, prediction_count=500, repeat=5):
+        self.movies_filepath = os.path.join(dataset_dir, 'training_movies.csv')
+        self.ratings_filepath = os.path.join(dataset_dir, 'training_ratings.csv')
+        self.links_filepath = os.path.join(dataset_dir, 'training_links.csv')
+        self.latent_factor_length = latent_factor_length
+        self.prediction_count = prediction_count
+        self.repeat = repeat
+
+    def run(self, benchmarks=None):
+        results = dict()
+        for name in benchmarks or self.BENCHMARKS:
+            results[name] = self.measure(name)
+        return results
+
+    # Returns seconds, ratings per second and peak RSS in MiB of one benchmark
+    def measure(self, name):
+        queue = Queue()
+        process = Process(target=self._measure_in_child, args=(name, queue))
+        process.start()
+        result = queue.get()
+        process.join()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _measure_in_child(self, name, queue):
+        try:
+            silence_output()
+            seconds, rating_count = getattr(self, name)()
+            queue.put({
+                'seconds': seconds,
+                'ratings_per_sec': rating_count / seconds if seconds > 0 else 0,
+                # ru_maxrss is in KiB on Linux
+                'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            })
+        except Exception as error:
+            queue.put(error)
+
+    '''
+    Benchmarks, each returns (seconds, ratings processed). Quick ones report the best of repeat runs,
+    which is far steadier between runs than a single timing.
+    '''
+    def csv_ingest(self):
+        seconds, matrix = self.best_of(lambda: RatingMatrix.parse_csv(self.ratings_filepath))
+        return seconds, len(matrix)
+
+    def gradient_descent_iteration(self):
+        trainer = self.trainer()
+        seconds, log = self.best_of(lambda: trainer.batch_gradient_descent(1))
+        return seconds, len(trainer.rating_values)
+
+    def tester_fold_in(self):
+        trainer = self.trainer()
+        tester = IncrementalSVDTester(self.ratings_filepath, trainer.movies)
+        tester.configure(0.1, 0.15, self.latent_factor_length)
+        tester.trained_features
+        seconds, thetas = self.best_of(tester.fold_in_users)
+        return seconds, len(tester.training_ratings)
+
+    def knn_hypothesis(self):
+        knn = KNearest(self.movies_filepath, self.ratings_filepath, self.links_filepath, seed=0)
+        pairs = []
+        for user_id in sorted(knn.users):
+            user = knn.users[user_id]
+            pairs.extend((user, knn.movies[movie_id]) for movie_id in user.hidden_ratings if movie_id in knn.movies)
+            if len(pairs) >= self.prediction_count:
+                break
+        pairs = pairs[:self.prediction_count]
+
+        # Every run starts from cold similarity and prediction caches
+        def predict():
+            knn.similarity_cache.clear()
+            knn.prediction_cache.clear()
+            for user, movie in pairs:
+                knn.hypothesis(user, movie)
+
+        seconds, result = self.best_of(predict)
+        return seconds, len(pairs)
+
+    def knn_rmse(self):
+        knn = KNearest(self.movies_filepath, self.ratings_filepath, self.links_filepath, seed=0)
+        start_time = time()
+        knn.rmse
+        return time() - start_time, sum(len(user.hidden_ratings) for user in knn.users.values())
+
+    # Returns the shortest of repeat timings of function, and its last result
+    def best_of(self, function):
+        best = None
+        for i in range(0, self.repeat):
+            start_time = time()
+            result = function()
+            seconds = time() - start_time
+            best = seconds if best is None else min(best, seconds)
+        return best, result
+
+    def trainer(self):
+        trainer = IncrementalSVDTrainer(self.movies_filepath, self.ratings_filepath, self.links_filepath)
+        trainer.configure(0.1, 0.15, self.latent_factor_length, seed=0)
+        return trainer
+
+'''
+Synthetic datasets in the layout of data/1k-users. Movie popularity follows a Zipf-like curve and
+a rating is a user bias plus a movie bias plus noise, rounded to the 0.5 star scale.
+'''
+def write_synthetic_dataset(dir, user_count, movie_count, ratings_per_user, seed=0):
+    random_state = numpy.random.RandomState(seed)
+    popularity = 1.0 / (numpy.arange(movie_count) + 10)
+    popularity /= numpy.sum(popularity)
+    movie_bias = random_state.normal(0, 0.5, movie_count)
+
+    with open(os.path.join(dir, 'training_movies.csv'), 'wb') as movie_file, \
+         open(os.path.join(dir, 'training_links.csv'), 'wb') as link_file:
+        movies, links = writer(movie_file), writer(link_file)
+        movies.writerow(['movieId', 'title', 'year', 'genres'])
+        links.writerow(['movieId', 'imdbId', 'tmdbId'])
+        for movie_id in range(1, movie_count + 1):
+            movies.writerow([movie_id, 'Movie %d' % movie_id, 2000, 'Drama'])
+            links.writerow([movie_id, 'tt%07d' % movie_id, movie_id])
+
+    with open(os.path.join(dir, 'training_ratings.csv'), 'wb') as rating_file:
+        ratings = writer(rating_file)
+        ratings.writerow(['userId', 'movieId', 'rating', 'timestamp'])
+        for user_id in range(1, user_count + 1):
+            count = min(movie_count, max(20, random_state.poisson(ratings_per_user)))
+            movie_idx = numpy.sort(random_state.choice(movie_count, count, replace=False, p=popularity))
+            values = 3.5 + random_state.normal(0, 0.5) + movie_bias[movie_idx] + random_state.normal(0, 0.8, count)
+            values = numpy.clip(numpy.round(values * 2) / 2, 0.5, 5.0)
+            timestamps = random_state.randint(800000000, 1500000000, count)
+            for m, value, timestamp in zip(movie_idx, values, timestamps):
+                ratings.writerow([user_id, m + 1, value, timestamp])
+
+def run_scale(name, benchmarks=None):
+    scale = SCALES[name]
+    if isinstance(scale, str):
+        return BenchmarkSuite(scale).run(benchmarks)
+
+    dir = tempfile.mkdtemp(prefix='benchmark-%s' % name)
+    try:
+        write_synthetic_dataset(dir, *scale)
+        return BenchmarkSuite(dir).run(benchmarks)
+    finally:
+        shutil.rmtree(dir)
+
+'''
+Baseline comparison: a benchmark regresses when it takes more than tolerance longer than its
+baseline time. Timings only compare on the machine the baseline was recorded on.
+'''
+def compare(results, baseline, tolerance=0.25):
+    lines, regressions = [], 0
+    lines.append('%-14s %-27s %10s %14s %10s %12s' % ('scale', 'benchmark', 'seconds', 'ratings/sec', 'peak MiB', 'vs base'))
+    for scale in sorted(results):
+        for name in BenchmarkSuite.BENCHMARKS:
+            if name not in results[scale]:
+                continue
+            result = results[scale][name]
+            base = baseline.get(scale, {}).get(name)
+            change = ''
+            if base is not None and base['seconds'] > 0:
+                ratio = result['seconds'] / base['seconds']
+                change = '%+.0f%%' % (100 * (ratio - 1))
+                if ratio > 1 + tolerance:
+                    change += ' SLOWER'
+                    regressions += 1
+            lines.append('%-14s %-27s %10.4f %14.0f %10.1f %12s' % (scale, name, result['seconds'],
+                                                                    result['ratings_per_sec'], result['peak_rss_mb'], change))
+    return '\n'.join(lines), regressions
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Time the loader, trainer, tester and KNN hot paths')
+    parser.add_argument('--scale', action='append', choices=sorted(SCALES), help='dataset to run, repeatable (default: 1k-users and synthetic-2k)')
+    parser.add_argument('--benchmark', action='append', choices=BenchmarkSuite.BENCHMARKS, help='benchmark to run, repeatable (default: all)')
+    parser.add_argument('--baseline', default=BASELINE_FILEPATH, help='baseline JSON to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='record these results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='slowdown that counts as a regression')
+    options = parser.parse_args()
+
+    results = dict()
+    for scale in options.scale or ['1k-users', 'synthetic-2k']:
+        results[scale] = run_scale(scale, options.benchmark)
+
+    baseline = dict()
+    if os.path.exists(options.baseline):
+        with open(options.baseline) as infile:
+            baseline = json.load(infile)
+
+    table, regressions = compare(results, baseline, options.tolerance)
+    print table
+
+    if options.save_baseline:
+        for scale in results:
+            baseline.setdefault(scale, {}).update(results[scale])
+        with open(options.baseline, 'w') as outfile:
+            json.dump(baseline, outfile, indent=2, sort_keys=True)
+        print '\nBaseline saved to %s' % options.baseline
+    elif regressions > 0:
+        exit(1)
@@ -0,0 +1,80 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from incremental_svd_trainer import IncrementalSVDTrainer
+from hyperparameter_search import silence_output
+from data_reducer import DataReducer
+from multiprocessing import Pool, cpu_count
+import random
+import numpy
+
+# The validation being run, inherited by forked pool workers instead of being pickled to them
+ACTIVE_VALIDATION = None
+
+class CrossValidation:
+    '''
+    k-fold cross validation of IncrementalSVDTrainer. Fold numbers are drawn once per rating from a
+    seeded RNG (see RatingMatrix.fold_ids); fold f trains on every rating outside it and is scored
+    on the ratings inside it. Folds are only boolean masks over the one rating matrix loaded here,
+    which forked workers share, so no per-user rating dicts are copied between folds.
+    '''
+    def __init__(self, movie_csv_filepath, rating_csv_filepath, link_csv_filepath, fold_count=5, stratified=True,
+                 seed=0, workers=None):
+        self.filepaths = (movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
+        self.reducer = DataReducer(movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
+        self.reducer.movie_titles
+
+        self.fold_count = fold_count
+        self.seed = seed
+        self.workers = workers or cpu_count()
+        self.folds = self.reducer.rating_matrix.fold_ids(fold_count, seed, stratified)
+
+    # method names a trainer method whose first argument is its iteration, sweep or epoch budget
+    def run(self, regularized_factor, learning_rate, latent_factor_length, method='alternating_least_squares',
+            budget=20):
+        global ACTIVE_VALIDATION
+        ACTIVE_VALIDATION = self
+        config = (regularized_factor, learning_rate, latent_factor_length, method, budget)
+
+        try:
+            if self.workers > 1:
+                pool = Pool(min(self.workers, self.fold_count), initializer=silence_output)
+                scores = pool.map(train_fold, [(fold,) + config for fold in range(0, self.fold_count)])
+                pool.close()
+                pool.join()
+            else:
+                scores = [self.train_fold(fold, *config) for fold in range(0, self.fold_count)]
+        finally:
+            ACTIVE_VALIDATION = None
+
+        scores = numpy.array(scores)
+        return {
+            'rmse': scores[:, 0].tolist(),
+            'mae': scores[:, 1].tolist(),
+            'rmse_mean': numpy.mean(scores[:, 0]),
+            'rmse_std': numpy.std(scores[:, 0]),
+            'mae_mean': numpy.mean(scores[:, 1]),
+            'mae_std': numpy.std(scores[:, 1]),
+        }
+
+    # Returns (RMSE, MAE) on the held out fold
+    def train_fold(self, fold, regularized_factor, learning_rate, latent_factor_length, method, budget):
+        random.seed(self.seed + fold)
+        trainer = IncrementalSVDTrainer(*self.filepaths, reducer=self.reducer)
+        trainer.configure(regularized_factor, learning_rate, latent_factor_length, hidden_mask=self.folds == fold)
+        getattr(trainer, method)(budget)
+        return trainer.cross_validation_rmse, trainer.cross_validation_mae
+
+def train_fold(args):
+    return ACTIVE_VALIDATION.train_fold(*args)
+
+def describe(scores):
+    return 'RMSE %.4f +/- %.4f, MAE %.4f +/- %.4f' % (scores['rmse_mean'], scores['rmse_std'], scores['mae_mean'], scores['mae_std'])
+
+if __name__ == '__main__':
+    validation = CrossValidation(
+            '../data/1k-users/training_movies.csv',
+            '../data/1k-users/training_ratings.csv',
+            '../data/1k-users/training_links.csv',
+        )
+    print describe(validation.run(0.1, 0.15, 8))
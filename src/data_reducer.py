@@ -3,165 +3,259 @@
 
 from csv import reader
 from csv import writer
-from sets import Set
+from random import Random
 from pdb import set_trace as debugger
+import numpy
+
+from rating_matrix import RatingMatrix
+from rating_reader import RatingReader
+from source_file import open_source
 
 class DataReducer:
 
-    def __init__(self, movies_file_path, ratings_file_path, links_file_path):
+    def __init__(self, movies_file_path, ratings_file_path, links_file_path, workers=1):
         # File paths
         self.movies_file_path = movies_file_path
         self.ratings_file_path = ratings_file_path
         self.links_file_path = links_file_path
 
+        # Number of processes parsing byte ranges of the ratings file
+        self.workers = workers
+
         # Properties
         self._movies = None
         self._users = None
+        self._movie_titles = None
+        self._rating_matrix = None
 
-        self._user_training_set = None
-        self._movie_training_set = None
-
+    '''
+    The ratings file is read once, into rating_matrix. The nested dicts below are only built when
+    something asks for them, and are derived from the matrix rather than from another parse.
+    '''
     @property
     def movies(self) :
         if self._movies is None:
-            # First, load movies
+            matrix = self.rating_matrix
+
             movie_dict = dict()
-            csv = reader(open(self.movies_file_path))
+            csv = reader(open_source(self.movies_file_path))
             for row in csv:
                 if row[0].isdigit():
                     movie_id, movie_title, movie_year = row[0], row[1], row[2]
                     movie_dict[movie_id] = {'title': movie_title, 'year': movie_year}
+                    if movie_id in matrix.movie_index:
+                        movie_dict[movie_id]['user_ratings'] = dict(matrix.raters_of_movie(movie_id).items())
 
-            rating_count = 0
-
-            # Then, load historical user ratings
-            user_dict = dict()
-            csv = reader(open(self.ratings_file_path))
-            for row in csv:
-                if row[0].isdigit():
-                    rating_count += 1
-                    user_id, movie_id, rating = row[0], row[1], row[2]
-                    if movie_dict[movie_id].get('user_ratings'):
-                        movie_dict[movie_id]['user_ratings'][user_id] = rating
-                    else:
-                        movie_dict[movie_id]['user_ratings'] = { user_id: rating }
-
-                    if user_dict.get(user_id):
-                        user_dict[user_id]['movie_ratings'][movie_id] = rating
-                    else:
-                        user_dict[user_id] = dict()
-                        user_dict[user_id]['movie_ratings'] = { movie_id: rating }
-
-            # Store them
-            self._users = user_dict
             self._movies = movie_dict
-            self.rating_count = rating_count
 
         return self._movies
 
     @property
     def users(self):
         if self._users is None:
-            rating_count = 0
+            matrix = self.rating_matrix
+
             user_dict = dict()
-            csv = reader(open(self.ratings_file_path))
-            for row in csv:
-                if row[0].isdigit():
-                    rating_count += 1
-                    user_id, movie_id, rating = row[0], row[1], row[2]
-                    if user_dict.get(user_id):
-                        user_dict[user_id]['movie_ratings'][movie_id] = rating
-                    else:
-                        user_dict[user_id] = dict()
-                        user_dict[user_id]['movie_ratings'] = { movie_id: rating }
+            for user_id in matrix.user_keys:
+                user_dict[user_id] = {'movie_ratings': dict(matrix.ratings_of_user(user_id).items())}
+
             self._users = user_dict
-            self.rating_count = rating_count
 
         return self._users
 
+    @property
+    def movie_titles(self):
+        if self._movie_titles is None:
+            title_dict = dict()
+            csv = reader(open_source(self.movies_file_path))
+            for row in csv:
+                if row[0].isdigit():
+                    title_dict[row[0]] = row[1]
+            self._movie_titles = title_dict
+
+        return self._movie_titles
+
+    # Compact alternative to the nested dicts of movies and users
+    @property
+    def rating_matrix(self):
+        if self._rating_matrix is None:
+            self._rating_matrix = RatingMatrix.from_csv(self.ratings_file_path, workers=self.workers)
+            self.rating_count = len(self._rating_matrix)
+
+        return self._rating_matrix
+
     '''
     API for saving training_set or test_set
     '''
     def export_training_set(self, starting_user_id, max_user_count, dir):
-        is_rating_export_successful = self._export_movie_ratings(starting_user_id, max_user_count, dir)
-        is_movie_export_successful = self._export_movies(dir)
-        is_link_export_successful = self._export_movie_links(dir)
-        if (is_rating_export_successful and is_movie_export_successful) and is_link_export_successful:
-            print 'Success!'
+        return self.export_splits([DataSplit(starting_user_id, max_user_count, dir)])
+
+    # Writes every split with one pass over ratings, one over movies and one over links
+    def export_splits(self, splits):
+        popularity = self._export_movie_ratings(splits)
+        self._export_movies(splits, popularity)
+        self._export_movie_links(splits)
+
+        is_successful = True
+        for split in splits:
+            if split.is_complete:
+                print 'Success! %s' % split.dir
+            is_successful = is_successful and split.is_complete
+        return is_successful
 
     '''
     Private methods
     '''
-    # Set constraint on number of users
-    def _export_movie_ratings(self, starting_user_id, max_user_count, dir):
-        csv = reader(open(self.ratings_file_path))
-        movie_training_set, user_training_set = Set(), Set()
-        with open(dir + '/training_ratings.csv', 'wt') as outfile:
-            output = writer(outfile)
-            output.writerow(('userId', 'movieId', 'rating', 'timestamp'))
-            write_count = 0
-            for row in csv:
-                if len(user_training_set) == max_user_count and row[0] not in user_training_set:
-                    self._movie_training_set = movie_training_set
-                    self._user_training_set = user_training_set
-                    print 'Exported rating count: %s from %s users' % (write_count, len(self._user_training_set))
-                    return True
+    # Ratings are expected grouped by user (as MovieLens ships them), so every user is offered to
+    # the splits exactly once, with all of their rating lines. Returns rating counts by movie ID.
+    def _export_movie_ratings(self, splits):
+        for split in splits:
+            split.open()
 
-                if row[0].isdigit():
-                    user_id = row[0]
-                    if int(user_id) >= starting_user_id:
-                        output.writerow((row[0], row[1], row[2], row[3]))
-                        movie_training_set.add(row[1])
-                        user_training_set.add(row[0])
-                        write_count += 1
+        popularity = numpy.zeros(0, dtype=numpy.int64)
+        pending_user_id, pending_lines, pending_movie_ids = None, [], []
+        for lines, values in RatingReader(self.ratings_file_path).line_blocks():
+            user_ids = values[:, 0].astype(numpy.int64)
+            movie_ids = values[:, 1].astype(numpy.int64)
+            if len(movie_ids) > 0:
+                counts = numpy.bincount(movie_ids)
+                if len(counts) > len(popularity):
+                    popularity = numpy.concatenate((popularity, numpy.zeros(len(counts) - len(popularity), dtype=numpy.int64)))
+                popularity[:len(counts)] += counts
 
+            bounds = [0] + (numpy.flatnonzero(numpy.diff(user_ids)) + 1).tolist() + [len(lines)]
+            for lo, hi in zip(bounds[:-1], bounds[1:]):
+                if lo == hi:
+                    continue
 
+                user_id = int(user_ids[lo])
+                if user_id != pending_user_id:
+                    if pending_user_id is not None:
+                        self._offer_user(splits, pending_user_id, pending_lines, pending_movie_ids)
+                    pending_user_id, pending_lines, pending_movie_ids = user_id, [], []
+                pending_lines.extend(lines[lo:hi])
+                pending_movie_ids.append(movie_ids[lo:hi])
 
-        self._movie_training_set = movie_training_set
-        self._user_training_set = user_training_set
-        return False
+        if pending_user_id is not None:
+            self._offer_user(splits, pending_user_id, pending_lines, pending_movie_ids)
 
-    def _export_movies(self, dir):
-        if self._movie_training_set is None:
-            return False
+        for split in splits:
+            split.close()
+            print 'Exported rating count: %s from %s users' % (split.rating_count, len(split.user_set))
+        return popularity
+
+    def _offer_user(self, splits, user_id, lines, movie_ids):
+        movie_ids = numpy.concatenate(movie_ids)
+        for split in splits:
+            split.offer(user_id, lines, movie_ids)
 
-        csv = reader(open(self.movies_file_path))
-        with open(dir + '/training_movies.csv', 'wt') as outfile:
-            output = writer(outfile)
+    def _export_movies(self, splits, popularity):
+        csv = reader(open_source(self.movies_file_path))
+        outfiles = [open(split.dir + '/training_movies.csv', 'wt') for split in splits]
+        outputs = [writer(outfile) for outfile in outfiles]
+        for output in outputs:
             output.writerow(('movieId', 'title', 'year', 'popularity', 'genres'))
-            write_count = 0
-            for row in csv:
-                if row[0].isdigit():
-                    movie_id = row[0]
-                    if movie_id in self._movie_training_set:
-                        title = row[1].strip()
-                        year = title[len(title) - 5: len(title) - 1]
-                        genres = row[2]
-                        title = title[:len(title) - 6].strip()
-                        popularity = len(self.movies[movie_id]['user_ratings'])
-                        output.writerow((movie_id, title, year, popularity, genres))
-                        write_count += 1
-            if write_count == len(self._movie_training_set):
-                print 'Exported movie count: %s' % write_count
-                return True
-            return False
 
-    def _export_movie_links(self, dir):
-        if self._movie_training_set is None:
-            return False
+        write_counts = [0] * len(splits)
+        for row in csv:
+            if row[0].isdigit():
+                movie_id = row[0]
+                title = row[1].strip()
+                year = title[len(title) - 5: len(title) - 1]
+                genres = row[2]
+                title = title[:len(title) - 6].strip()
+                movie_popularity = popularity[int(movie_id)] if int(movie_id) < len(popularity) else 0
+                for i, split in enumerate(splits):
+                    if int(movie_id) in split.movie_set:
+                        outputs[i].writerow((movie_id, title, year, movie_popularity, genres))
+                        write_counts[i] += 1
+
+        for i, split in enumerate(splits):
+            outfiles[i].close()
+            print 'Exported movie count: %s' % write_counts[i]
+            split.is_complete = split.is_complete and write_counts[i] == len(split.movie_set)
 
-        csv = reader(open(self.links_file_path))
-        with open(dir + '/training_links.csv', 'wt') as outfile:
-            output = writer(outfile)
+    def _export_movie_links(self, splits):
+        csv = reader(open_source(self.links_file_path))
+        outfiles = [open(split.dir + '/training_links.csv', 'wt') for split in splits]
+        outputs = [writer(outfile) for outfile in outfiles]
+        for output in outputs:
             output.writerow(('movieId', 'imdbId', 'tmdbId'))
-            write_count = 0
-            for row in csv:
-                if row[0].isdigit() and row[0] in self._movie_training_set:
-                    output.writerow((row[0], "tt" + row[1], row[2]))
-                    write_count += 1
-            if write_count == len(self._movie_training_set):
-                return True
+
+        write_counts = [0] * len(splits)
+        for row in csv:
+            if row[0].isdigit():
+                for i, split in enumerate(splits):
+                    if int(row[0]) in split.movie_set:
+                        outputs[i].writerow((row[0], "tt" + row[1], row[2]))
+                        write_counts[i] += 1
+
+        for i, split in enumerate(splits):
+            outfiles[i].close()
+            split.is_complete = split.is_complete and write_counts[i] == len(split.movie_set)
+
+class DataSplit:
+    '''
+    One exported data set. Users with IDs from starting_user_id up are taken either in file order
+    ('first', the original behavior) or as a uniform reservoir sample ('random'), optionally only
+    when their rating count lies within [min_rating_count, max_rating_count].
+    '''
+    def __init__(self, starting_user_id, max_user_count, dir, sampling='first', min_rating_count=0, max_rating_count=None, seed=None):
+        self.starting_user_id = starting_user_id
+        self.max_user_count = max_user_count
+        self.dir = dir
+        self.sampling = sampling
+        self.min_rating_count = min_rating_count
+        self.max_rating_count = max_rating_count
+        self.random = Random(seed)
+
+        self.user_set = set()
+        self.movie_set = set()
+        self.rating_count = 0
+        self.eligible_count = 0
+        self.is_complete = False
+
+        # (user_id, lines, movie_ids) of the users currently in the reservoir
+        self._reservoir = []
+        self._outfile = None
+
+    def accepts(self, user_id, rating_count):
+        if user_id < self.starting_user_id or rating_count < self.min_rating_count:
             return False
+        return self.max_rating_count is None or rating_count <= self.max_rating_count
+
+    def offer(self, user_id, lines, movie_ids):
+        if not self.accepts(user_id, len(lines)):
+            return
+
+        self.eligible_count += 1
+        if self.sampling == 'random':
+            if len(self._reservoir) < self.max_user_count:
+                self._reservoir.append((user_id, lines, movie_ids))
+            else:
+                slot = self.random.randint(0, self.eligible_count - 1)
+                if slot < self.max_user_count:
+                    self._reservoir[slot] = (user_id, lines, movie_ids)
+        elif len(self.user_set) < self.max_user_count:
+            self._write(user_id, lines, movie_ids)
+
+    def open(self):
+        self._outfile = open(self.dir + '/training_ratings.csv', 'wb')
+        self._outfile.write('userId,movieId,rating,timestamp\r\n')
+
+    def close(self):
+        for user_id, lines, movie_ids in sorted(self._reservoir):
+            self._write(user_id, lines, movie_ids)
+        self._reservoir = []
+        self._outfile.close()
+        self.is_complete = len(self.user_set) == self.max_user_count
+
+    def _write(self, user_id, lines, movie_ids):
+        # Lines are copied verbatim with the \r\n terminator csv.writer used to produce
+        self._outfile.write('\r\n'.join(lines) + '\r\n')
+        self.user_set.add(user_id)
+        self.movie_set.update(movie_ids.tolist())
+        self.rating_count += len(lines)
 
 
 if __name__ == '__main__':
@@ -183,9 +277,9 @@ if __name__ == '__main__':
     # print 'Total rating count: %s' % (rating_count)
 
     # Starting user_id is 200,000 and we are exporting 20,000 users
-    print reducer.export_training_set(200000, 20000, '../data/20k-users')
-
-    # Test set is similar to training set
-    # print reducer.export_training_set(230000, 1000, '../data/1k-users')
-
-    # print reducer.export_training_set(190000, 10, '../data/10-users')
+    # and the test set is similar to training set; both come out of one pass over the full data
+    print reducer.export_splits([
+        DataSplit(200000, 20000, '../data/20k-users'),
+        DataSplit(230000, 1000, '../data/1k-users'),
+        # DataSplit(190000, 10, '../data/10-users'),
+    ])
@@ -0,0 +1,103 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from csv import reader
+from struct import Struct
+import os
+import numpy
+
+class FactorStore:
+    '''
+    Binary latent-factor file. Layout:
+
+        header   magic, version, k, row count and numpy dtype string, padded to 64 bytes
+        ids      row count int64 movie/user IDs, row i of the matrix belongs to ids[i]
+        factors  (row count, k) matrix, starting on the next 64 byte boundary
+
+    Opening a store reads the header and ID map and memory-maps the matrix read-only, so processes
+    serving the same file share its page-cache pages instead of parsing their own copy.
+    '''
+    MAGIC = 'RECFACT\x00'
+    VERSION = 1
+    HEADER = Struct('<8sIIQ8s')
+    ALIGNMENT = 64
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        with open(filepath, 'rb') as infile:
+            magic, version, k, row_count, dtype = self.HEADER.unpack(infile.read(self.HEADER.size))
+            if magic != self.MAGIC or version != self.VERSION:
+                raise IOError('%s is not a version %d factor store' % (filepath, self.VERSION))
+
+        self.k = k
+        self.dtype = numpy.dtype(dtype.rstrip('\x00'))
+        self.ids = numpy.memmap(filepath, dtype=numpy.int64, mode='r', offset=self.ALIGNMENT, shape=(row_count,))
+        if row_count > 0:
+            self.factors = numpy.memmap(filepath, dtype=self.dtype, mode='r', offset=self.factor_offset(row_count), shape=(row_count, k))
+        else:
+            self.factors = numpy.zeros((0, k), dtype=self.dtype)
+        self._index = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    # String ID => row number, built on first lookup
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = dict((str(row_id), i) for i, row_id in enumerate(self.ids.tolist()))
+        return self._index
+
+    def factor(self, row_id):
+        return self.factors[self.index[str(row_id)]]
+
+    @classmethod
+    def factor_offset(cls, row_count):
+        ids_end = cls.ALIGNMENT + 8 * row_count
+        return ((ids_end + cls.ALIGNMENT - 1) // cls.ALIGNMENT) * cls.ALIGNMENT
+
+    # Written to a temporary file and renamed into place, so readers never map half a store
+    @classmethod
+    def save(cls, filepath, ids, factors, dtype=numpy.float32):
+        ids = numpy.asarray(ids, dtype=numpy.int64)
+        factors = numpy.ascontiguousarray(factors, dtype=dtype)
+        row_count, k = factors.shape
+
+        scratch_filepath = '%s.tmp%d' % (filepath, os.getpid())
+        with open(scratch_filepath, 'wb') as outfile:
+            header = cls.HEADER.pack(cls.MAGIC, cls.VERSION, k, row_count, numpy.dtype(dtype).str)
+            outfile.write(header.ljust(cls.ALIGNMENT, '\x00'))
+            outfile.write(ids.tostring())
+            outfile.write('\x00' * (cls.factor_offset(row_count) - cls.ALIGNMENT - 8 * row_count))
+            outfile.write(factors.tostring())
+        os.rename(scratch_filepath, filepath)
+        return True
+
+    # Rows can't grow in place because the factors start after the ID map, so the store is copied
+    # with the new rows at the end and renamed over the old one. Open stores keep the old mapping.
+    @classmethod
+    def append(cls, filepath, ids, factors):
+        store = cls(filepath)
+        ids = numpy.concatenate((store.ids, numpy.asarray(ids, dtype=numpy.int64)))
+        factors = numpy.concatenate((store.factors, numpy.asarray(factors, dtype=store.dtype).reshape(-1, store.k)))
+        return cls.save(filepath, ids, factors, store.dtype)
+
+# Read a movie_features.csv written by IncrementalSVDTrainer.export_feature into (ids, factors)
+def read_feature_csv(filepath):
+    ids, rows = [], []
+    csv = reader(open(filepath))
+    for row in csv:
+        if row[0].isdigit():
+            ids.append(int(row[0]))
+            rows.append([float(value) for value in row[1:]])
+
+    return numpy.array(ids, dtype=numpy.int64), numpy.array(rows, dtype=numpy.float64)
+
+# (ids, factors) from either a FactorStore or a feature CSV, told apart by the store's magic bytes
+def read_factors(filepath):
+    with open(filepath, 'rb') as infile:
+        is_store = infile.read(len(FactorStore.MAGIC)) == FactorStore.MAGIC
+    if is_store:
+        store = FactorStore(filepath)
+        return numpy.array(store.ids), numpy.array(store.factors, dtype=numpy.float64)
+    return read_feature_csv(filepath)
@@ -0,0 +1,151 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from incremental_svd_trainer import IncrementalSVDTrainer
+from data_reducer import DataReducer
+from multiprocessing import Pool, cpu_count
+from itertools import product
+from csv import writer
+from time import time
+from math import log, exp
+import tempfile
+import shutil
+import random
+import sys
+import os
+import numpy
+
+# The search being run, inherited by forked pool workers instead of being pickled to them
+ACTIVE_SEARCH = None
+
+class HyperparameterSearch:
+    '''
+    Successive halving over configure() settings. Ratings are parsed (or mapped from the rating
+    cache) once in this process before the pool forks, so every worker reads the same copy-on-write
+    pages instead of loading its own, and all trials use the same holdout.
+
+    Every rung trains the surviving configurations to a larger iteration budget, ranks them by
+    cross-validation RMSE and keeps the best 1 / reduction_factor. Survivors resume from the
+    checkpoint of their previous rung rather than starting over.
+    '''
+    def __init__(self, movie_csv_filepath, rating_csv_filepath, link_csv_filepath, workers=None, seed=0):
+        self.filepaths = (movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
+        self.reducer = DataReducer(movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
+        self.reducer.rating_matrix
+        self.reducer.movie_titles
+
+        self.workers = workers or cpu_count()
+        self.seed = seed
+        self.checkpoint_dir = None
+
+    # configs is a list of dicts with regularized_factor, learning_rate and latent_factor_length
+    def run(self, configs, min_iteration=50, max_iteration=1500, reduction_factor=3, result_filepath=None):
+        global ACTIVE_SEARCH
+        ACTIVE_SEARCH = self
+        self.checkpoint_dir = tempfile.mkdtemp(prefix='hyperparameter_search')
+        pool = Pool(self.workers, initializer=silence_output)
+
+        results = []
+        trials = list(enumerate(configs))
+        iteration = min_iteration
+        try:
+            while trials:
+                # The last survivor goes straight to the full budget
+                iteration = max_iteration if len(trials) == 1 else min(iteration, max_iteration)
+                rung = pool.map(train_trial, [(trial, config, iteration) for trial, config in trials])
+                results.extend(rung)
+                if iteration >= max_iteration:
+                    break
+
+                rung.sort(key=ranking_rmse)
+                survivors = set(result['trial'] for result in rung[:max(1, len(rung) // reduction_factor)])
+                trials = [(trial, config) for trial, config in trials if trial in survivors]
+                iteration *= reduction_factor
+        finally:
+            pool.close()
+            pool.join()
+            shutil.rmtree(self.checkpoint_dir)
+            ACTIVE_SEARCH = None
+
+        if result_filepath is not None:
+            self.export_results(results, result_filepath)
+        return results
+
+    def train(self, trial, config, iteration):
+        start_time = time()
+        random.seed(self.seed + trial)
+        trainer = IncrementalSVDTrainer(*self.filepaths, reducer=self.reducer)
+        trainer.configure(config['regularized_factor'], config['learning_rate'], config['latent_factor_length'],
+                          seed=self.seed)
+        checkpoint_filepath = os.path.join(self.checkpoint_dir, 'trial-%d.npz' % trial)
+        trainer.batch_gradient_descent(iteration, checkpoint_filepath, iteration)
+
+        result = dict(config)
+        result.update({
+            'trial': trial,
+            'iteration': iteration,
+            'training_rmse': trainer.training_rmse,
+            'cross_validation_rmse': trainer.cross_validation_rmse,
+            'seconds': time() - start_time,
+        })
+        return result
+
+    def export_results(self, results, filepath):
+        columns = ['trial', 'regularized_factor', 'learning_rate', 'latent_factor_length', 'iteration',
+                   'training_rmse', 'cross_validation_rmse', 'seconds']
+        with open(filepath, 'wt') as outfile:
+            output = writer(outfile)
+            output.writerow(columns)
+            for result in sorted(results, key=lambda result: (-result['iteration'], ranking_rmse(result))):
+                output.writerow([result[column] for column in columns])
+        return True
+
+def train_trial(args):
+    return ACTIVE_SEARCH.train(*args)
+
+# NaN compares false both ways and would sort anywhere, so diverged trials rank last
+def ranking_rmse(result):
+    rmse = result['cross_validation_rmse']
+    return rmse if numpy.isfinite(rmse) else float('inf')
+
+# Workers' progress bars would interleave, so their standard output goes to /dev/null
+def silence_output():
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+
+'''
+Search spaces map a configure() argument to its candidate values: a list is a set of choices, a
+(low, high) tuple is a range that random_space samples log-uniformly (integers stay integers).
+'''
+def grid_space(space):
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in product(*[space[name] for name in names])]
+
+def random_space(space, count, seed=None):
+    random_state = numpy.random.RandomState(seed)
+    configs = []
+    for i in range(0, count):
+        config = dict()
+        for name in sorted(space):
+            values = space[name]
+            if isinstance(values, tuple):
+                low, high = values
+                value = exp(random_state.uniform(log(low), log(high)))
+                config[name] = int(round(value)) if isinstance(low, int) else value
+            else:
+                config[name] = values[random_state.randint(len(values))]
+        configs.append(config)
+    return configs
+
+if __name__ == '__main__':
+    search = HyperparameterSearch(
+            '../data/20k-users/training_movies.csv',
+            '../data/20k-users/training_ratings.csv',
+            '../data/20k-users/training_links.csv',
+        )
+    configs = grid_space({
+        'regularized_factor': [0.03, 0.1, 0.3, 1.0],
+        'learning_rate': [0.05, 0.15, 0.3],
+        'latent_factor_length': [4, 8, 16],
+    })
+    search.run(configs, result_filepath='../data/20k-users/hyperparameter_search.csv')
@@ -1,30 +1,25 @@
 # Project: Recommender System
 # Author(s): Calvin Feng
 
-from csv import reader
 from math import sqrt
 from pdb import set_trace as debugger
 
 from user import User
+from rating_matrix import RatingMatrix
 from progress import Progress
+import numpy
 
 class IncrementalSVDTester:
-    def __init__(self, rating_csv_filepath, trained_movies):
-        self.rating_count = 0
-        self.test_user_data = dict()
-
-        csv = reader(open(rating_csv_filepath))
-        for row in csv:
-            if row[0].isdigit():
-                self.rating_count += 1
-                user_id, movie_id, rating = row[0], row[1], row[2]
-                if self.test_user_data.get(user_id):
-                    self.test_user_data[user_id]['movie_ratings'][movie_id] = rating
-                else:
-                    self.test_user_data[user_id] = dict()
-                    self.test_user_data[user_id]['movie_ratings'] = { movie_id: rating }
+    def __init__(self, ratings, trained_movies):
+        # Accepts a RatingMatrix or the path of a ratings CSV
+        if isinstance(ratings, RatingMatrix):
+            self.ratings = ratings
+        else:
+            self.ratings = RatingMatrix.from_csv(ratings)
+        self.rating_count = len(self.ratings)
 
         self.trained_movies = trained_movies
+        self._trained_features = None
 
     def configure(self, regularized_factor, learning_rate, latent_factor_length):
         # Define regularization constant to control overfitting
@@ -36,10 +31,14 @@ class IncrementalSVDTester:
         # Define how many latent factors we wish to use for SVD
         self.latent_factor_length = latent_factor_length
 
+        # The gradient loops below probe ratings by movie ID, so users keep plain dicts
+        training_ratings, hidden_ratings = self.ratings.holdout(2)
+        self.training_ratings = training_ratings
         self.users = dict()
-        for user_id in self.test_user_data:
-            user = self.test_user_data[user_id]
-            self.users[user_id] = User(user_id, user['movie_ratings'], latent_factor_length, True)
+        for user_id in training_ratings.user_keys:
+            ratings = dict(training_ratings.ratings_of_user(user_id).items())
+            hidden = dict(hidden_ratings.ratings_of_user(user_id).items())
+            self.users[user_id] = User(user_id, ratings, latent_factor_length, hidden_ratings=hidden)
 
     @property
     def training_rmse(self):
@@ -137,7 +136,7 @@ class IncrementalSVDTester:
         log = []
         current_iteration = 1
         while current_iteration <= total_iteration:
-            progress.report(current_iteration, self.content_based_cost)
+            progress.report(current_iteration, lambda: self.content_based_cost)
 
             # ==> Compute partial derivatives
             # Derivative of cost function wrt movie features
@@ -163,3 +162,81 @@ class IncrementalSVDTester:
             current_iteration += 1
         progress.complete()
         return log
+
+    '''
+    Closed-form fold-in. With the movie features frozen, the cost above is a separate ridge
+    regression per user, and gradient descent converges to the solution of
+
+        (X^T X + lambda D) theta = X^T r,    D = diag(0, 1, ..., 1)
+
+    where X holds the features of the trained movies the user rated; theta[0] is not regularized.
+    Users without a trained movie keep theta = (1, 0, ..., 0), where gradient descent leaves them.
+    '''
+    @property
+    def trained_features(self):
+        if self._trained_features is None:
+            movie_ids = list(self.trained_movies)
+            features = numpy.array([self.trained_movies[movie_id].feature for movie_id in movie_ids], dtype=numpy.float64)
+            index = dict((movie_id, i) for i, movie_id in enumerate(movie_ids))
+            self._trained_features = (features.reshape(len(movie_ids), self.latent_factor_length), index)
+
+        return self._trained_features
+
+    # Returns theta for one {movie_id: rating} mapping
+    def fold_in(self, ratings):
+        return self.fold_in_batch([ratings])[0]
+
+    # Returns a (len(rating_list), k) matrix, row i is theta for rating_list[i]
+    def fold_in_batch(self, rating_list, block_size=4096):
+        index = self.trained_features[1]
+        slot, feature_rows, values = [], [], []
+        for i, ratings in enumerate(rating_list):
+            for movie_id, rating in ratings.items():
+                row = index.get(movie_id)
+                if row is not None:
+                    slot.append(i)
+                    feature_rows.append(row)
+                    values.append(float(rating))
+
+        return self.solve_thetas(numpy.array(slot, dtype=numpy.int64), numpy.array(feature_rows, dtype=numpy.int64),
+                                 numpy.array(values, dtype=numpy.float64), len(rating_list), block_size)
+
+    # Fold in every configured user at once, straight from the training RatingMatrix
+    def fold_in_users(self, block_size=4096):
+        index = self.trained_features[1]
+        ratings = self.training_ratings
+        movie_rows = numpy.array([index.get(movie_id, -1) for movie_id in ratings.movie_keys], dtype=numpy.int64)
+        rows = movie_rows[ratings.movie_idx]
+        trained = rows >= 0
+
+        thetas = self.solve_thetas(ratings.user_idx[trained], rows[trained], ratings.ratings[trained].astype(numpy.float64),
+                                   len(ratings.user_ids), block_size)
+        for u, user_id in enumerate(ratings.user_keys):
+            self.users[user_id].theta = thetas[u]
+        return thetas
+
+    # slot must be sorted. Each user's normal equations are built with one BLAS product over their
+    # contiguous segment, then the systems of block_size users are stacked into one numpy.linalg.solve
+    def solve_thetas(self, slot, feature_rows, values, user_count, block_size=4096):
+        features = self.trained_features[0]
+        k = self.latent_factor_length
+        penalty = self.regularized_factor * numpy.diag([0] + [1] * (k - 1))
+        bounds = numpy.searchsorted(slot, numpy.arange(0, user_count + 1))
+
+        thetas = numpy.zeros((user_count, k))
+        for start in range(0, user_count, block_size):
+            end = min(start + block_size, user_count)
+
+            # Users without a trained movie solve I theta = e0
+            a = numpy.tile(numpy.identity(k), (end - start, 1, 1))
+            b = numpy.zeros((end - start, k))
+            b[:, 0] = 1
+            for u in range(start, end):
+                lo, hi = bounds[u], bounds[u + 1]
+                if hi > lo:
+                    x = features[feature_rows[lo:hi]]
+                    a[u - start] = numpy.dot(x.T, x) + penalty
+                    b[u - start] = numpy.dot(x.T, values[lo:hi])
+            thetas[start:end] = numpy.linalg.solve(a, b)
+
+        return thetas
@@ -5,19 +5,41 @@ from movie import Movie
 from user import User
 from data_reducer import DataReducer
 from progress import Progress
+from factor_store import FactorStore, read_factors
 
 from pdb import set_trace as debugger
 from math import sqrt
+from time import time
 from csv import writer
+from multiprocessing import Process, RawArray, cpu_count
+from multiprocessing.pool import ThreadPool
+import random
+import os
+import numpy
+
+# Sum the rows of values that share the same index into a (size, k) matrix
+def scatter_rows(index, values, size):
+    result = numpy.zeros((size, values.shape[1]))
+    for k in range(0, values.shape[1]):
+        result[:, k] = numpy.bincount(index, weights=values[:, k], minlength=size)
+    return result
+
+# Copy a float64 matrix into a RawArray so that forked worker processes write to the same pages
+def shared_matrix(values):
+    matrix = numpy.frombuffer(RawArray('d', values.size), dtype=numpy.float64).reshape(values.shape)
+    matrix[:] = values
+    return matrix
 
 class IncrementalSVDTrainer:
-    def __init__(self, movie_csv_filepath, rating_csv_filepath, link_csv_filepath):
-        self.reducer = DataReducer(movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
+    def __init__(self, movie_csv_filepath, rating_csv_filepath, link_csv_filepath, reducer=None):
+        # An already loaded DataReducer can be passed in, so several trainers share one parse
+        self.reducer = reducer or DataReducer(movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
         self.regularized_factor = None
         self.learning_rate = None
         self.latent_factor_length = None
+        self.workers = 1
 
-    def configure(self, regularized_factor, learning_rate, latent_factor_length):
+    def configure(self, regularized_factor, learning_rate, latent_factor_length, workers=1, seed=None, hidden_mask=None):
         # Define regularization constant to control overfitting
         self.regularized_factor = regularized_factor
 
@@ -27,158 +49,352 @@ class IncrementalSVDTrainer:
         # Define how many latent factors we wish to use for SVD
         self.latent_factor_length = latent_factor_length
 
+        # Number of processes running lock-free (Hogwild) SGD; factors go in shared memory when > 1
+        self.workers = workers
+
+        # Hold out 2 ratings per user for cross validation; a run resumed from a checkpoint must use
+        # the same seed to train on the same ratings. A boolean mask over the rating matrix (e.g.
+        # one fold of CrossValidation) picks the held out ratings instead.
+        if hidden_mask is None:
+            self.training_ratings, self.hidden_ratings = self.reducer.rating_matrix.holdout(2, seed)
+        else:
+            matrix = self.reducer.rating_matrix
+            self.training_ratings, self.hidden_ratings = matrix.select(~hidden_mask), matrix.select(hidden_mask)
+
         self.movies = dict()
-        for movie_id in self.reducer.movies:
-            movie = self.reducer.movies[movie_id]
-            self.movies[movie_id] = Movie(movie_id, movie['title'], movie['user_ratings'], latent_factor_length)
+        titles = self.reducer.movie_titles
+        for movie_id in self.training_ratings.movie_keys:
+            ratings = self.training_ratings.raters_of_movie(movie_id)
+            self.movies[movie_id] = Movie(movie_id, titles.get(movie_id), ratings, latent_factor_length)
 
         self.users = dict()
-        for user_id in self.reducer.users:
-            user = self.reducer.users[user_id]
-            self.users[user_id] = User(user_id, user['movie_ratings'], latent_factor_length, True)
+        for user_id in self.training_ratings.user_keys:
+            ratings = self.training_ratings.ratings_of_user(user_id)
+            hidden_ratings = self.hidden_ratings.ratings_of_user(user_id)
+            self.users[user_id] = User(user_id, ratings, latent_factor_length, hidden_ratings=hidden_ratings)
+
+        self._build_rating_arrays()
 
     # The cost property represents the value of cost/loss function
     @property
     def cost(self):
         if self.regularized_factor is None:
             return None
+        return self.cost_of(self.residuals())
+
+    # RMSE stands for Root-mean-squared-error
+    @property
+    def training_rmse(self):
+        return self.rmse_of(self.residuals())
 
+    # Cost and training RMSE of residuals the caller already computed, e.g. for this iteration's gradients
+    def cost_of(self, residuals):
         # m denotes number of training examples
-        m = 0
-
-        sq_error = 0
-        for movie_id in self.movies:
-            movie = self.movies[movie_id]
-            for user_id in movie.viewer_ids:
-                user = self.users[user_id]
-                if user.movie_ratings.get(movie.id):
-                    sq_error += (movie.hypothesis(user) - float(user.movie_ratings[movie.id]))**2
-                    m += 1
-        sq_error *= (0.5 / m)
-
-        regularized_term = 0
-        for movie_id in self.movies:
-            movie = self.movies[movie_id]
-            for k in range(0, len(movie.feature)):
-                regularized_term += movie.feature[k]**2
-
-        for user_id in self.users:
-            user = self.users[user_id]
-            for k in range(0, len(user.theta)):
-                regularized_term += user.theta[k]**2
+        m = len(residuals)
+
+        sq_error = 0.5 * numpy.dot(residuals, residuals) / m
+
+        regularized_term = numpy.sum(self.movie_features**2) + numpy.sum(self.user_thetas**2)
         regularized_term *= (0.5 * self.regularized_factor / m)
 
         return regularized_term + sq_error
 
-    # RMSE stands for Root-mean-squared-error
-    @property
-    def training_rmse(self):
-        sq_error = 0
-        m = 0
-        for user_id in self.users:
-            user = self.users[user_id]
-            for movie_id in user.movie_ratings:
-                movie = self.movies[movie_id]
-                sq_error += (movie.hypothesis(user) - float(user.movie_ratings[movie_id]))**2
-                m += 1
-
-        return sqrt(sq_error / m)
+    def rmse_of(self, residuals):
+        return sqrt(numpy.dot(residuals, residuals) / len(residuals))
 
     @property
     def cross_validation_rmse(self):
-        sq_error = 0
-        m = 0
-        for user_id in self.users:
-            user = self.users[user_id]
-            for movie_id in user.hidden_ratings:
-                movie = self.movies[movie_id]
-                sq_error += (movie.hypothesis(user) - float(user.hidden_ratings[movie_id]))**2
-                m += 1
+        errors = self.cross_validation_errors()
+        return sqrt(numpy.dot(errors, errors) / len(errors))
 
-        return sqrt(sq_error / m)
+    @property
+    def cross_validation_mae(self):
+        return numpy.mean(numpy.abs(self.cross_validation_errors()))
+
+    def cross_validation_errors(self):
+        hypothesis = numpy.sum(self.movie_features[self.hidden_movie_idx] * self.user_thetas[self.hidden_user_idx], axis=1)
+        return hypothesis - self.hidden_values
 
     '''
-    Partial derivatives, wrt => with respect to
+    Rating arrays: every training rating is stored once in COO form, sorted by user so that
+    user_indptr doubles as a CSR row pointer (see RatingMatrix). Movie features and user preferences live in dense
+    (n_movies, k) and (n_users, k) matrices; Movie.feature and User.theta are row views into them.
     '''
-    def dj_wrt_movie_feature_k(self, movie, k):
-        derivative_sum = 0
-        m = 0
-        for user_id in movie.viewer_ids:
-            user = self.users[user_id]
-            if user.movie_ratings.get(movie.id):
-                derivative_sum += (movie.hypothesis(user) - float(user.movie_ratings[movie.id])) * user.theta[k]
-                m += 1
-
-        if m == 0:
-            return derivative_sum + (self.regularized_factor * movie.feature[k])
+    def _build_rating_arrays(self):
+        # RatingMatrix already interned IDs in this order, so its indices are row numbers here
+        self.movie_ids = self.training_ratings.movie_keys
+        self.user_ids = self.training_ratings.user_keys
+
+        self.rating_movie_idx = self.training_ratings.movie_idx
+        self.rating_user_idx = self.training_ratings.user_idx
+        self.rating_values = self.training_ratings.ratings.astype(numpy.float64)
+        self.hidden_movie_idx = self.hidden_ratings.movie_idx
+        self.hidden_user_idx = self.hidden_ratings.user_idx
+        self.hidden_values = self.hidden_ratings.ratings.astype(numpy.float64)
+
+        self.movie_rating_counts = self.training_ratings.movie_counts
+        self.user_rating_counts = self.training_ratings.user_counts
+        self.user_indptr = self.training_ratings.user_indptr
+
+        # Movie-major (CSC) copy of the index arrays for solves that walk the raters of each movie
+        self.movie_indptr = self.training_ratings.movie_indptr
+        self.movie_rating_user_idx = self.training_ratings.column_user_idx
+        self.movie_rating_values = self.rating_values[self.training_ratings.movie_order]
+
+        self.movie_features = numpy.array([self.movies[movie_id].feature for movie_id in self.movie_ids], dtype=numpy.float64)
+        self.user_thetas = numpy.array([self.users[user_id].theta for user_id in self.user_ids], dtype=numpy.float64)
+        if self.workers > 1:
+            self.movie_features = shared_matrix(self.movie_features)
+            self.user_thetas = shared_matrix(self.user_thetas)
+        for i, movie_id in enumerate(self.movie_ids):
+            self.movies[movie_id].feature = self.movie_features[i]
+
+        for j, user_id in enumerate(self.user_ids):
+            self.users[user_id].theta = self.user_thetas[j]
+
+    def residuals(self):
+        hypothesis = numpy.sum(self.movie_features[self.rating_movie_idx] * self.user_thetas[self.rating_user_idx], axis=1)
+        return hypothesis - self.rating_values
 
-        return (derivative_sum / m) + (self.regularized_factor * movie.feature[k] / m)
-
-    def dj_wrt_user_theta_k(self, user, k):
-        derivative_sum = 0
-        m = 0
-        for movie_id in user.movie_ratings:
-            movie = self.movies[movie_id]
-            if movie.user_ratings.get(user.id):
-                derivative_sum += (movie.hypothesis(user) - float(user.movie_ratings[movie_id])) * movie.feature[k]
-                m += 1
-
-        if m == 0:
-            return derivative_sum + (self.regularized_factor * user.theta[k])
-
-        return (derivative_sum / m) + (self.regularized_factor * user.theta[k] / m)
+    '''
+    Partial derivatives, wrt => with respect to
+    Each row is divided by the number of ratings it received (or 1 if it has none), which is what
+    the per-k scalar derivatives used to do.
+    '''
+    def dj_wrt_movie_features(self, residuals):
+        derivative_sum = scatter_rows(self.rating_movie_idx, residuals[:, None] * self.user_thetas[self.rating_user_idx], len(self.movie_ids))
+        m = numpy.maximum(self.movie_rating_counts, 1)[:, None]
+        return (derivative_sum + (self.regularized_factor * self.movie_features)) / m
 
+    def dj_wrt_user_thetas(self, residuals):
+        derivative_sum = scatter_rows(self.rating_user_idx, residuals[:, None] * self.movie_features[self.rating_movie_idx], len(self.user_ids))
+        m = numpy.maximum(self.user_rating_counts, 1)[:, None]
+        return (derivative_sum + (self.regularized_factor * self.user_thetas)) / m
 
-    def batch_gradient_descent(self):
+    def batch_gradient_descent(self, total_iteration=1500, checkpoint_filepath=None, checkpoint_interval=100):
         if self.learning_rate is None or self.regularized_factor is None:
             return False
 
-        total_iteration = 1500
         progress = Progress('Gradient Descent', total_iteration)
 
         log = []
         current_iteration = 1
+        if checkpoint_filepath is not None and os.path.exists(checkpoint_filepath):
+            current_iteration = self.load_checkpoint(checkpoint_filepath) + 1
         while current_iteration <= total_iteration:
-            progress.report(current_iteration, self.cost)
+            # ==> One residual pass feeds both gradients and, when progress prints, the cost
+            residuals = self.residuals()
+            progress.report(current_iteration, lambda: self.cost_of(residuals))
 
             # ==> Compute partial derivatives
-            # Derivative of cost function wrt movie features
-            dj_dmovies = dict()
-            for movie_id in self.movies:
-                movie = self.movies[movie_id]
-                n = len(movie.feature)
-                dj_dmovies[movie.id] = []
-                for k in range(0, n):
-                    dj_dmovies[movie.id].append(self.dj_wrt_movie_feature_k(movie, k))
-
-            # Derivative of cost function wrt user preferences
-            dj_dusers = dict()
-            for user_id in self.users:
-                user = self.users[user_id]
-                n = len(user.theta)
-                dj_dusers[user.id] = []
-                for k in range(0, n):
-                    dj_dusers[user.id].append(self.dj_wrt_user_theta_k(user, k))
-
-            # Apply gradient_descent
-            for movie_id in dj_dmovies:
-                dj_dfeature = dj_dmovies[movie_id]
-                movie = self.movies[movie_id]
-                n = len(movie.feature)
-                for k in range(0, n):
-                    movie.feature[k] = movie.feature[k] - (self.learning_rate * dj_dfeature[k])
+            dj_dmovies = self.dj_wrt_movie_features(residuals)
+            dj_dusers = self.dj_wrt_user_thetas(residuals)
 
-            for user_id in dj_dusers:
-                dj_dtheta = dj_dusers[user_id]
-                user = self.users[user_id]
-                n = len(user.theta)
-                for k in range(0, n):
-                    user.theta[k] = user.theta[k] - (self.learning_rate * dj_dtheta[k])
+            # Apply gradient_descent in place so Movie.feature and User.theta views stay current
+            self.movie_features -= self.learning_rate * dj_dmovies
+            self.user_thetas -= self.learning_rate * dj_dusers
 
+            if checkpoint_filepath is not None and current_iteration % checkpoint_interval == 0:
+                self.save_checkpoint(checkpoint_filepath, current_iteration)
             current_iteration +=1
         progress.complete()
         return log
 
+    '''
+    Mini-batch stochastic gradient descent: the rating arrays are shuffled once per epoch and each
+    batch only updates the movie and user rows it touches. A touched row steps along the mean
+    gradient of its ratings in the batch plus its share of the regularization. Rows without any
+    training ratings are never touched, so they take their regularization step once per epoch;
+    together a batch that covers every rating reproduces one batch_gradient_descent iteration.
+
+    With workers > 1 the shuffled ratings are split into one shard per worker process and every
+    worker updates the shared factor matrices without locks (Hogwild). Ratings are sparse enough
+    that two workers rarely touch the same row at once.
+    '''
+    def stochastic_gradient_descent(self, total_epoch=10, batch_size=256, seed=None, checkpoint_filepath=None,
+                                    checkpoint_interval=1):
+        if self.learning_rate is None or self.regularized_factor is None:
+            return False
+
+        random_state = numpy.random.RandomState(seed)
+        progress = Progress('Stochastic Gradient Descent', total_epoch)
+
+        log = []
+        elapsed = 0
+        current_epoch = 1
+        if checkpoint_filepath is not None and os.path.exists(checkpoint_filepath):
+            current_epoch = self.load_checkpoint(checkpoint_filepath, random_state) + 1
+        first_epoch = current_epoch
+        while current_epoch <= total_epoch:
+            progress.report(current_epoch, lambda: self.cost)
+
+            start_time = time()
+            order = random_state.permutation(len(self.rating_values))
+            if self.workers > 1:
+                processes = [Process(target=self._mini_batch_epoch, args=(shard, batch_size))
+                             for shard in numpy.array_split(order, self.workers)]
+                for process in processes:
+                    process.start()
+
+                for process in processes:
+                    process.join()
+            else:
+                self._mini_batch_epoch(order, batch_size)
+            self._shrink_unrated_rows()
+            elapsed += time() - start_time
+
+            residuals = self.residuals()
+            log.append([current_epoch, self.cost_of(residuals), self.rmse_of(residuals), self.cross_validation_rmse])
+            if checkpoint_filepath is not None and current_epoch % checkpoint_interval == 0:
+                self.save_checkpoint(checkpoint_filepath, current_epoch, random_state)
+            current_epoch += 1
+        progress.complete()
+        if elapsed > 0:
+            epoch_count = current_epoch - first_epoch
+            progress.describe('%d worker(s): %d ratings/sec' % (self.workers, epoch_count * len(self.rating_values) / elapsed))
+        return log
+
+    def _mini_batch_epoch(self, order, batch_size):
+        for start in range(0, len(order), batch_size):
+            self._mini_batch_step(order[start:start + batch_size])
+
+    def _mini_batch_step(self, batch):
+        movie_idx, user_idx = self.rating_movie_idx[batch], self.rating_user_idx[batch]
+        movie_rows, user_rows = self.movie_features[movie_idx], self.user_thetas[user_idx]
+        residuals = numpy.sum(movie_rows * user_rows, axis=1) - self.rating_values[batch]
+
+        touched_movies, movie_slot = numpy.unique(movie_idx, return_inverse=True)
+        touched_users, user_slot = numpy.unique(user_idx, return_inverse=True)
+        dj_dmovies = self._touched_row_gradient(movie_slot, residuals[:, None] * user_rows,
+                                                self.movie_features[touched_movies], self.movie_rating_counts[touched_movies])
+        dj_dusers = self._touched_row_gradient(user_slot, residuals[:, None] * movie_rows,
+                                               self.user_thetas[touched_users], self.user_rating_counts[touched_users])
+
+        self.movie_features[touched_movies] -= self.learning_rate * dj_dmovies
+        self.user_thetas[touched_users] -= self.learning_rate * dj_dusers
+
+    # Regularization is the whole gradient of a row without ratings, as in dj_wrt_movie_features
+    def _shrink_unrated_rows(self):
+        unrated_movies = numpy.flatnonzero(self.movie_rating_counts == 0)
+        unrated_users = numpy.flatnonzero(self.user_rating_counts == 0)
+        self.movie_features[unrated_movies] -= self.learning_rate * self.regularized_factor * self.movie_features[unrated_movies]
+        self.user_thetas[unrated_users] -= self.learning_rate * self.regularized_factor * self.user_thetas[unrated_users]
+
+    def _touched_row_gradient(self, slot, derivative_terms, rows, rating_counts):
+        batch_counts = numpy.bincount(slot)[:, None]
+        derivative_sum = scatter_rows(slot, derivative_terms, len(rows))
+        return (derivative_sum / batch_counts) + (self.regularized_factor * rows / rating_counts[:, None])
+
+    '''
+    Alternating least squares: with movie features fixed every user's theta is the solution of a
+    k x k ridge system, and vice versa. Rows are solved in blocks on a thread pool; the LAPACK calls
+    behind numpy.linalg.solve release the GIL so the blocks run on every core.
+    '''
+    def alternating_least_squares(self, total_sweep=20, workers=None, block_size=1024):
+        if self.regularized_factor is None:
+            return False
+
+        pool = ThreadPool(workers or cpu_count())
+        progress = Progress('Alternating Least Squares', total_sweep)
+
+        log = []
+        current_sweep = 1
+        while current_sweep <= total_sweep:
+            progress.report(current_sweep, lambda: self.cost)
+
+            self._solve_rows(pool, self.user_thetas, self.user_indptr, self.rating_movie_idx,
+                             self.rating_values, self.movie_features, block_size)
+            self._solve_rows(pool, self.movie_features, self.movie_indptr, self.movie_rating_user_idx,
+                             self.movie_rating_values, self.user_thetas, block_size)
+
+            residuals = self.residuals()
+            log.append([current_sweep, self.cost_of(residuals), self.rmse_of(residuals), self.cross_validation_rmse])
+            current_sweep += 1
+        pool.close()
+        pool.join()
+        progress.complete()
+        return log
+
+    def _solve_rows(self, pool, rows, indptr, fixed_idx, values, fixed_rows, block_size):
+        blocks = [(start, min(start + block_size, len(rows))) for start in range(0, len(rows), block_size)]
+        pool.map(lambda block: self._solve_block(rows, indptr, fixed_idx, values, fixed_rows, block[0], block[1]), blocks)
+
+    # Each row's system is built from only its own ratings, so memory stays O(block_size * k^2)
+    def _solve_block(self, rows, indptr, fixed_idx, values, fixed_rows, start, end):
+        k = rows.shape[1]
+        penalty = self.regularized_factor * numpy.identity(k)
+        a = numpy.tile(penalty, (end - start, 1, 1))
+        b = numpy.zeros((end - start, k))
+        for row in range(start, end):
+            lo, hi = indptr[row], indptr[row + 1]
+            if hi > lo:
+                fixed = fixed_rows[fixed_idx[lo:hi]]
+                a[row - start] += numpy.dot(fixed.T, fixed)
+                b[row - start] = numpy.dot(fixed.T, values[lo:hi])
+
+        rows[start:end] = numpy.linalg.solve(a, b)
+
+    '''
+    Warm start: rows of a previous run's factors (a feature CSV or a FactorStore) are copied in by
+    ID. Movies and users missing from the snapshot keep their random initialization. Returns the
+    number of movie and user rows that were found.
+    '''
+    def warm_start(self, movie_factor_filepath, user_factor_filepath=None):
+        movie_count = self._copy_rows(movie_factor_filepath, self.training_ratings.movie_ids, self.movie_features)
+        user_count = 0
+        if user_factor_filepath is not None:
+            user_count = self._copy_rows(user_factor_filepath, self.training_ratings.user_ids, self.user_thetas)
+        return movie_count, user_count
+
+    def _copy_rows(self, filepath, row_ids, rows):
+        ids, factors = read_factors(filepath)
+        if factors.shape[1] != rows.shape[1]:
+            raise IOError('%s has %d latent factors, expected %d' % (filepath, factors.shape[1], rows.shape[1]))
+
+        # row_ids are sorted, RatingMatrix interns IDs in ascending order
+        position = numpy.minimum(numpy.searchsorted(row_ids, ids), len(row_ids) - 1)
+        found = row_ids[position] == ids
+        rows[position[found]] = factors[found]
+        return int(numpy.sum(found))
+
+    '''
+    Checkpoints: factors, the last completed iteration (or epoch) and the state of the Python and
+    numpy random generators, written to a temporary file and renamed into place so a crash never
+    leaves half a checkpoint behind.
+    '''
+    def save_checkpoint(self, filepath, iteration, random_state=None):
+        python_version, python_state, python_gauss = random.getstate()
+        numpy_state = (random_state or numpy.random).get_state()
+
+        scratch_filepath = '%s.tmp%d' % (filepath, os.getpid())
+        with open(scratch_filepath, 'wb') as outfile:
+            numpy.savez(outfile, movie_features=self.movie_features, user_thetas=self.user_thetas,
+                        iteration=iteration, python_random_version=python_version,
+                        python_random_state=numpy.array(python_state, dtype=numpy.int64),
+                        python_random_gauss=numpy.nan if python_gauss is None else python_gauss,
+                        numpy_random_keys=numpy_state[1], numpy_random_position=numpy_state[2],
+                        numpy_random_has_gauss=numpy_state[3], numpy_random_gauss=numpy_state[4])
+        os.rename(scratch_filepath, filepath)
+        return True
+
+    # Restores factors and random state in place, returns the iteration the checkpoint was taken at
+    def load_checkpoint(self, filepath, random_state=None):
+        checkpoint = numpy.load(filepath)
+        if checkpoint['movie_features'].shape != self.movie_features.shape or checkpoint['user_thetas'].shape != self.user_thetas.shape:
+            raise IOError('%s does not match the configured ratings and latent factor length' % filepath)
+        self.movie_features[:] = checkpoint['movie_features']
+        self.user_thetas[:] = checkpoint['user_thetas']
+
+        python_gauss = float(checkpoint['python_random_gauss'])
+        random.setstate((int(checkpoint['python_random_version']),
+                         tuple(int(value) for value in checkpoint['python_random_state']),
+                         None if numpy.isnan(python_gauss) else python_gauss))
+        (random_state or numpy.random).set_state(('MT19937', checkpoint['numpy_random_keys'],
+                                                  int(checkpoint['numpy_random_position']),
+                                                  int(checkpoint['numpy_random_has_gauss']),
+                                                  float(checkpoint['numpy_random_gauss'])))
+        return int(checkpoint['iteration'])
+
     def export_feature(self, dir):
         feature_length = self.latent_factor_length
         with open(dir + '/movie_features.csv', 'wt') as outfile:
@@ -191,7 +407,13 @@ class IncrementalSVDTrainer:
 
             for movie_id in self.movies:
                 movie = self.movies[movie_id]
-                output.writerow([movie.id] + movie.feature)
+                output.writerow([movie.id] + movie.feature.tolist())
+        return True
+
+    # Binary counterpart of export_feature, see FactorStore; user preferences are exported as well
+    def export_factors(self, dir, dtype=numpy.float32):
+        FactorStore.save(dir + '/movie_features.bin', self.training_ratings.movie_ids, self.movie_features, dtype)
+        FactorStore.save(dir + '/user_features.bin', self.training_ratings.user_ids, self.user_thetas, dtype)
         return True
 
 if __name__ == '__main__':
@@ -0,0 +1,107 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from movie import Movie
+from user import User
+from data_reducer import DataReducer
+from neighbor_graph import NeighborGraph
+from math import sqrt
+import numpy
+
+class ItemKNearest:
+    '''
+    Item-based collaborative filtering. Movie-movie similarities are precomputed once, keeping the
+    top k neighbours of every movie in flat CSR arrays, and a prediction only combines the user's
+    own ratings of the target movie's neighbours:
+
+        r(u, m) = mean(m) + sum sim(m, j) * (r(u, j) - mean(j)) / sum |sim(m, j)|
+
+    over the neighbours j of m that u rated, so it costs O(k) instead of a scan over every rater.
+    '''
+    # A loaded reducer (the trainer's, say) shares its rating matrix instead of parsing the CSV again
+    def __init__(self, movie_csv_filepath, rating_csv_filepath, link_csv_filepath, seed=None, reducer=None):
+        reducer = reducer or DataReducer(movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
+
+        latent_factor_length = 0
+
+        # A fixed seed reproduces the holdout, which a saved neighbor graph must have been built on
+        training_ratings, hidden_ratings = reducer.rating_matrix.holdout(2, seed)
+        self.training_ratings = training_ratings
+        self.movie_means = training_ratings.movie_sums / numpy.maximum(training_ratings.movie_counts, 1)
+        self.neighbor_graph = None
+        titles = reducer.movie_titles
+
+        self.movies = dict()
+        for movie_id in training_ratings.movie_keys:
+            ratings = training_ratings.raters_of_movie(movie_id)
+            self.movies[movie_id] = Movie(movie_id, titles.get(movie_id), ratings, latent_factor_length)
+
+        self.users = dict()
+        for user_id in training_ratings.user_keys:
+            ratings = training_ratings.ratings_of_user(user_id)
+            hidden = hidden_ratings.ratings_of_user(user_id)
+            self.users[user_id] = User(user_id, ratings, latent_factor_length, hidden_ratings=hidden)
+
+    def build_neighbors(self, k=50, min_common=20):
+        self.neighbor_graph = NeighborGraph.build(self.training_ratings.transpose(), k, min_common)
+        return self.neighbor_graph
+
+    # Movie IDs are the same in every split, so the graph is checked against the fingerprint of
+    # this instance's training split instead
+    def load_neighbors(self, filepath):
+        graph = NeighborGraph.load(filepath)
+        if graph.fingerprint != self.training_ratings.transpose().fingerprint:
+            raise IOError('%s was not built on this training split' % filepath)
+        self.neighbor_graph = graph
+        return graph
+
+    # The graph is built with the default k on the first prediction if none was built or loaded
+    def hypothesis(self, user, movie):
+        if self.neighbor_graph is None:
+            self.build_neighbors()
+        m = self.training_ratings.movie_index[movie.id]
+        graph = self.neighbor_graph
+        lo, hi = graph.indptr[m], graph.indptr[m + 1]
+        neighbors, sims = graph.neighbors[lo:hi], graph.similarities[lo:hi]
+
+        # Neighbours the user rated, found by binary search in the user's sorted movie indices
+        rated = user.movie_ratings.indices
+        position = numpy.minimum(numpy.searchsorted(rated, neighbors), max(len(rated) - 1, 0))
+        if len(rated) == 0:
+            return 'Insufficient information'
+        hit = rated[position] == neighbors
+        sims = sims[hit]
+        sim_norm = numpy.sum(numpy.abs(sims))
+        if sim_norm == 0:
+            return 'Insufficient information'
+
+        deviations = user.movie_ratings.values[position[hit]] - self.movie_means[neighbors[hit]]
+        return float(self.movie_means[m] + numpy.dot(sims, deviations) / sim_norm)
+
+    @property
+    def rmse(self):
+        sq_error = 0
+        m = 0
+        for user_id in self.users:
+            user = self.users[user_id]
+            for movie_id in user.hidden_ratings:
+                if movie_id not in self.movies:
+                    continue
+                predicted_rating = self.hypothesis(user, self.movies[movie_id])
+                if isinstance(predicted_rating, float):
+                    sq_error += (predicted_rating - float(user.hidden_ratings[movie_id]))**2
+                    m += 1
+
+        return sqrt(sq_error / m)
+
+if __name__ == '__main__':
+    knn = ItemKNearest(
+            '../data/20k-users/training_movies.csv',
+            '../data/20k-users/training_ratings.csv',
+            '../data/20k-users/training_links.csv',
+            seed=0,
+        )
+    knn.build_neighbors()
+    knn.neighbor_graph.save('../data/20k-users/movie_neighbors.npz')
+
+    print knn.rmse
@@ -5,34 +5,87 @@ from movie import Movie
 from user import User
 from data_reducer import DataReducer
 from progress import Progress
+from neighbor_graph import NeighborGraph
+from lru_cache import LRUCache
 from math import sqrt
 from pdb import set_trace
 from random import uniform
 
 class KNearest:
 
-    def __init__(self, movie_csv_filepath, rating_csv_filepath, link_csv_filepath):
-        reducer = DataReducer(movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
+    # Similarity caching is off by default: User.sim is cheap enough that a cold scan spends more on
+    # cache bookkeeping than it saves. A loaded reducer (the trainer's, say) shares its rating matrix.
+    def __init__(self, movie_csv_filepath, rating_csv_filepath, link_csv_filepath, seed=None, cache_size=10000,
+                 similarity_cache_size=0, reducer=None):
+        reducer = reducer or DataReducer(movie_csv_filepath, rating_csv_filepath, link_csv_filepath)
 
         latent_factor_length = 0
 
+        # A fixed seed reproduces the holdout, which a saved neighbor graph must have been built on
+        training_ratings, hidden_ratings = reducer.rating_matrix.holdout(2, seed)
+        self.training_ratings = training_ratings
+        self.neighbor_graph = None
+
+        # Similarities are keyed by the sorted user IDs, predictions by user and movie ID, each with
+        # the versions of those users and movies; update_rating bumps versions instead of evicting
+        self.similarity_cache = LRUCache(similarity_cache_size)
+        self.prediction_cache = LRUCache(cache_size)
+        self.user_versions = dict()
+        self.movie_versions = dict()
+        titles = reducer.movie_titles
+
+        # Movie.user_ratings is a read-only view of the training matrix, the rater sets also pick up
+        # ratings added through update_rating
         self.movies = dict()
-        for movie_id in reducer.movies:
-            movie = reducer.movies[movie_id]
-            self.movies[movie_id] = Movie(movie_id, movie['title'], movie['user_ratings'], latent_factor_length)
+        self.raters = dict()
+        for movie_id in training_ratings.movie_keys:
+            ratings = training_ratings.raters_of_movie(movie_id)
+            self.movies[movie_id] = Movie(movie_id, titles.get(movie_id), ratings, latent_factor_length)
+            self.raters[movie_id] = set(ratings.keys())
 
+        # Users keep plain dicts so that update_rating can change them
         self.users = dict()
-        for user_id in reducer.users:
-            user = reducer.users[user_id]
-            self.users[user_id] = User(user_id, user['movie_ratings'], latent_factor_length, True)
+        for user_id in training_ratings.user_keys:
+            ratings = dict(training_ratings.ratings_of_user(user_id).items())
+            hidden = dict(hidden_ratings.ratings_of_user(user_id).items())
+            self.users[user_id] = User(user_id, ratings, latent_factor_length, hidden_ratings=hidden)
+
+    '''
+    Precomputed neighbours: with a NeighborGraph, hypothesis only looks at the user's top k
+    neighbours instead of computing sim() against every rater of the movie
+    '''
+    def build_neighbors(self, k=50):
+        self.neighbor_graph = NeighborGraph.build(self.training_ratings, k)
+        self.prediction_cache.clear()
+        return self.neighbor_graph
+
+    # The graph must come from this instance's training split, see NeighborGraph's __main__
+    def load_neighbors(self, filepath):
+        graph = NeighborGraph.load(filepath)
+        if graph.fingerprint != self.training_ratings.fingerprint:
+            raise IOError('%s was not built on this training split' % filepath)
+        self.neighbor_graph = graph
+        self.prediction_cache.clear()
+        return graph
 
     def hypothesis(self, user, movie):
-        neighbor_ids = movie.user_ratings.keys()
+        key = (user.id, movie.id, self.user_versions.get(user.id, 0), self.movie_versions.get(movie.id, 0))
+        prediction = self.prediction_cache.get(key)
+        if prediction is None:
+            if self.neighbor_graph is not None:
+                prediction = self.neighbor_hypothesis(user, movie)
+            else:
+                prediction = self.scan_hypothesis(user, movie)
+            self.prediction_cache.put(key, prediction)
+        return prediction
+
+    def scan_hypothesis(self, user, movie):
+        neighbor_ids = self.raters.get(movie.id, ())
         score = 0
         sim_norm = 0
         for id in neighbor_ids:
             neighbor = self.users[id]
-            sim = user.sim(neighbor)
+            sim = self.sim(user, neighbor)
             if (sim > 0.70 or sim < -0.70)  and neighbor.movie_ratings.get(movie.id):
                 score += sim * (float(neighbor.movie_ratings[movie.id]) - float(neighbor.avg_rating))
                 sim_norm += abs(sim)
@@ -42,6 +95,48 @@ class KNearest:
 
         return user.avg_rating + (score / sim_norm)
 
+    def sim(self, user, other_user):
+        if self.similarity_cache.capacity <= 0:
+            return user.sim(other_user)
+
+        if other_user.id < user.id:
+            user, other_user = other_user, user
+        key = (user.id, other_user.id, self.user_versions.get(user.id, 0), self.user_versions.get(other_user.id, 0))
+        sim = self.similarity_cache.get(key)
+        if sim is None:
+            sim = user.sim(other_user)
+            self.similarity_cache.put(key, sim)
+        return sim
+
+    '''
+    A changed rating alters the user's own similarities and predictions, and the prediction of
+    every user for the movies this user rated. The neighbor graph, if any, is not rebuilt.
+    '''
+    def update_rating(self, user_id, movie_id, rating):
+        self.users[user_id].update_rating(movie_id, rating)
+        self.raters.setdefault(movie_id, set()).add(user_id)
+        self.invalidate_user(user_id)
+
+    def invalidate_user(self, user_id):
+        self.user_versions[user_id] = self.user_versions.get(user_id, 0) + 1
+        for movie_id in self.users[user_id].movie_ratings:
+            self.movie_versions[movie_id] = self.movie_versions.get(movie_id, 0) + 1
+
+    def neighbor_hypothesis(self, user, movie):
+        score = 0
+        sim_norm = 0
+        neighbor_ids, sims = self.neighbor_graph.neighbors_of(user.id)
+        for id, sim in zip(neighbor_ids, sims):
+            neighbor = self.users[id]
+            if (sim > 0.70 or sim < -0.70) and neighbor.movie_ratings.get(movie.id):
+                score += sim * (float(neighbor.movie_ratings[movie.id]) - float(neighbor.avg_rating))
+                sim_norm += abs(sim)
+
+        if sim_norm == 0:
+            return 'Insufficient information'
+
+        return user.avg_rating + (score / sim_norm)
+
     @property
     def rmse(self):
         sq_error = 0
@@ -52,7 +147,7 @@ class KNearest:
                 movie = self.movies[movie_id]
                 predicted_rating = self.hypothesis(user, movie)
                 if isinstance(predicted_rating, float):
-                    sq_error += (self.hypothesis(user, movie) - float(user.hidden_ratings[movie_id]))**2
+                    sq_error += (predicted_rating - float(user.hidden_ratings[movie_id]))**2
                     m += 1
                 #
                 # sq_error += (uniform(0.5, 5) - float(user.hidden_ratings[movie_id]))**2
@@ -66,6 +161,8 @@ if __name__ == '__main__':
             '../data/20k-users/training_movies.csv',
             '../data/20k-users/training_ratings.csv',
             '../data/20k-users/training_links.csv',
+            seed=0,
         )
+    knn.build_neighbors()
 
     print knn.rmse
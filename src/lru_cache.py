@@ -0,0 +1,49 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from collections import OrderedDict
+
+class LRUCache:
+    '''
+    Bounded least-recently-used cache with hit/miss counters. There is no invalidation: callers put
+    a version of everything a value depends on into its key, so stale entries are simply never
+    looked up again and age out. A capacity of 0 turns the cache off.
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return float(self.hits) / lookups if lookups > 0 else 0
+
+    def get(self, key, default=None):
+        if key not in self._entries:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        value = self._entries.pop(key)
+        self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
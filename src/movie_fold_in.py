@@ -0,0 +1,77 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from factor_store import FactorStore
+import numpy
+
+class MovieFoldIn:
+    '''
+    Cold-start movie features. With every user's theta frozen, the trainer's cost is a separate
+    ridge regression per movie, solved in closed form:
+
+        (T^T T + lambda I) x = T^T r
+
+    where T holds the thetas of the users who rated the movie. Ratings from users without a theta
+    are ignored; a movie with none of them gets the zero vector.
+    '''
+    def __init__(self, user_ids, user_thetas, regularized_factor=0.1):
+        self.user_keys = [str(user_id) for user_id in numpy.asarray(user_ids, dtype=numpy.int64).tolist()]
+        self.user_index = dict((key, i) for i, key in enumerate(self.user_keys))
+        self.user_thetas = numpy.asarray(user_thetas, dtype=numpy.float64)
+        self.regularized_factor = regularized_factor
+
+    @classmethod
+    def from_store(cls, user_store_filepath, regularized_factor=0.1):
+        store = FactorStore(user_store_filepath)
+        return cls(store.ids, store.factors, regularized_factor)
+
+    @classmethod
+    def from_trainer(cls, trainer):
+        return cls(trainer.training_ratings.user_ids, trainer.user_thetas, trainer.regularized_factor)
+
+    # Returns the feature vector for one {user_id: rating} mapping
+    def fold_in(self, ratings):
+        return self.fold_in_batch([ratings])[0]
+
+    # Returns a (len(rating_list), k) matrix, row i is the feature vector for rating_list[i]
+    def fold_in_batch(self, rating_list, block_size=4096):
+        k = self.user_thetas.shape[1]
+        penalty = self.regularized_factor * numpy.identity(k)
+
+        features = numpy.zeros((len(rating_list), k))
+        for start in range(0, len(rating_list), block_size):
+            end = min(start + block_size, len(rating_list))
+            a = numpy.tile(numpy.identity(k), (end - start, 1, 1))
+            b = numpy.zeros((end - start, k))
+            for i in range(start, end):
+                rows, values = self.known_ratings(rating_list[i])
+                if len(rows) > 0:
+                    thetas = self.user_thetas[rows]
+                    a[i - start] = numpy.dot(thetas.T, thetas) + penalty
+                    b[i - start] = numpy.dot(thetas.T, values)
+            features[start:end] = numpy.linalg.solve(a, b)
+
+        return features
+
+    def known_ratings(self, ratings):
+        rows, values = [], []
+        for user_id, rating in ratings.items():
+            row = self.user_index.get(str(user_id))
+            if row is not None:
+                rows.append(row)
+                values.append(float(rating))
+        return numpy.array(rows, dtype=numpy.int64), numpy.array(values, dtype=numpy.float64)
+
+    '''
+    Catalog drop: fold in a batch of new movies and append them to whichever serving structures
+    are given, none of which is rebuilt.
+    '''
+    def add_movies(self, movie_ids, rating_list, store_filepath=None, ann_index=None, recommender=None):
+        features = self.fold_in_batch(rating_list)
+        if store_filepath is not None:
+            FactorStore.append(store_filepath, movie_ids, features)
+        if ann_index is not None:
+            ann_index.add(movie_ids, features)
+        if recommender is not None:
+            recommender.add_movies(movie_ids, features)
+        return features
@@ -0,0 +1,146 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from time import time
+import sys
+import numpy
+
+class NeighborGraph:
+    '''
+    Precomputed user-user Pearson similarities, the same ones User.sim computes: ratings are
+    centred on each user's own mean, sums run over co-rated movies only and pairs with fewer than
+    min_common co-rated movies (or a zero variance) get 0. Only each user's top k neighbours by
+    absolute similarity are kept, as a CSR graph over RatingMatrix user indices.
+
+    Built on RatingMatrix.transpose() the rows are movies instead, which gives item-item Pearson
+    similarities centred on each movie's mean; ItemKNearest uses it that way.
+    '''
+    def __init__(self, user_ids, indptr, neighbors, similarities, fingerprint=None):
+        self.user_ids = numpy.asarray(user_ids, dtype=numpy.int64)
+        self.user_keys = [str(user_id) for user_id in self.user_ids.tolist()]
+        self.user_index = dict((key, i) for i, key in enumerate(self.user_keys))
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.similarities = similarities
+
+        # RatingMatrix.fingerprint of the ratings the graph was built on
+        self.fingerprint = fingerprint
+
+    # Returns (neighbour user IDs, similarities) of one user, strongest first
+    def neighbors_of(self, user_id):
+        u = self.user_index.get(user_id)
+        if u is None:
+            return [], []
+        lo, hi = self.indptr[u], self.indptr[u + 1]
+        return [self.user_keys[v] for v in self.neighbors[lo:hi]], self.similarities[lo:hi].tolist()
+
+    '''
+    Offline computation, straight from the sparse rater lists. Every rating (u, m) of a block of row
+    users is paired with each rater v of movie m from the CSC arrays, and with c the centred
+    ratings the four sums Pearson needs are accumulated per (u, v) cell with bincount:
+        numerator          sum c_um c_vm
+        row variance       sum c_um^2
+        column variance    sum c_vm^2
+        co-rated count     sum 1
+    The work is the number of co-rated (u, v, m) triples instead of users^2 x movies, and memory
+    is a block_size x users array per sum. chunk_size bounds how many triples are expanded at once.
+    '''
+    @classmethod
+    def build(cls, ratings, k=50, min_common=20, block_size=256, chunk_size=1 << 22):
+        user_count = len(ratings.user_ids)
+        means = ratings.user_sums / numpy.maximum(ratings.user_counts, 1)
+        centred = ratings.ratings - means[ratings.user_idx]
+        column_centred = centred[ratings.movie_order]
+        k = min(k, user_count)
+
+        indptr = numpy.zeros(user_count + 1, dtype=numpy.int64)
+        neighbor_blocks, similarity_blocks = [], []
+        for row_start in range(0, user_count, block_size):
+            row_end = min(row_start + block_size, user_count)
+            numerator, row_variance, column_variance, common = cls.co_rated_sums(ratings, centred, column_centred,
+                                                                                 row_start, row_end, chunk_size)
+
+            denominator = numpy.sqrt(row_variance * column_variance)
+            valid = (common >= min_common) & (denominator > 0)
+            similarities = numpy.zeros(numerator.shape, dtype=numpy.float32)
+            similarities[valid] = numerator[valid] / denominator[valid]
+
+            # A user is not their own neighbour
+            rows = numpy.arange(row_end - row_start)
+            similarities[rows, rows + row_start] = 0
+
+            best_neighbors = numpy.argpartition(-numpy.abs(similarities), k - 1, axis=1)[:, :k]
+            best_similarities = numpy.take_along_axis(similarities, best_neighbors, axis=1)
+            order = numpy.argsort(-numpy.abs(best_similarities), axis=1)
+            best_neighbors = numpy.take_along_axis(best_neighbors, order, axis=1)
+            best_similarities = numpy.take_along_axis(best_similarities, order, axis=1)
+            kept = best_similarities != 0
+            indptr[row_start + 1:row_end + 1] = numpy.sum(kept, axis=1)
+            neighbor_blocks.append(best_neighbors[kept].astype(numpy.int32))
+            similarity_blocks.append(best_similarities[kept])
+
+        return cls(ratings.user_ids, numpy.cumsum(indptr), numpy.concatenate(neighbor_blocks), numpy.concatenate(similarity_blocks),
+                   ratings.fingerprint)
+
+    # Returns the four Pearson sums as (row users start to end) x users arrays
+    @classmethod
+    def co_rated_sums(cls, ratings, centred, column_centred, start, end, chunk_size):
+        user_count = len(ratings.user_ids)
+        cell_count = (end - start) * user_count
+        sums = numpy.zeros((4, cell_count))
+
+        lo, hi = ratings.user_indptr[start], ratings.user_indptr[end]
+        movies = ratings.movie_idx[lo:hi]
+        rater_starts = ratings.movie_indptr[movies]
+        rater_counts = ratings.movie_indptr[movies + 1] - rater_starts
+        pair_ends = numpy.cumsum(rater_counts)
+
+        chunk_start = 0
+        while chunk_start < hi - lo:
+            pair_start = pair_ends[chunk_start] - rater_counts[chunk_start]
+            chunk_end = max(numpy.searchsorted(pair_ends, pair_start + chunk_size, side='right'), chunk_start + 1)
+            counts = rater_counts[chunk_start:chunk_end]
+
+            # Row rating and CSC position of every (u, v, m) triple in the chunk
+            rating = numpy.repeat(numpy.arange(lo + chunk_start, lo + chunk_end), counts)
+            position = numpy.arange(len(rating)) + numpy.repeat(rater_starts[chunk_start:chunk_end] - (numpy.cumsum(counts) - counts), counts)
+
+            cell = (ratings.user_idx[rating] - start) * user_count + ratings.column_user_idx[position]
+            row_value, column_value = centred[rating], column_centred[position]
+            sums[0] += numpy.bincount(cell, row_value * column_value, cell_count)
+            sums[1] += numpy.bincount(cell, row_value**2, cell_count)
+            sums[2] += numpy.bincount(cell, column_value**2, cell_count)
+            sums[3] += numpy.bincount(cell, None, cell_count)
+            chunk_start = chunk_end
+
+        return sums.reshape(4, end - start, user_count)
+
+    '''
+    Persistence
+    '''
+    def save(self, filepath):
+        arrays = dict(user_ids=self.user_ids, indptr=self.indptr, neighbors=self.neighbors, similarities=self.similarities)
+        if self.fingerprint is not None:
+            arrays['fingerprint'] = numpy.array(self.fingerprint)
+        numpy.savez(filepath, **arrays)
+        return True
+
+    # Graphs saved before fingerprints were recorded load with fingerprint None
+    @classmethod
+    def load(cls, filepath):
+        archive = numpy.load(filepath)
+        fingerprint = str(archive['fingerprint']) if 'fingerprint' in archive.files else None
+        return cls(archive['user_ids'], archive['indptr'], archive['neighbors'], archive['similarities'], fingerprint)
+
+if __name__ == '__main__':
+    from rating_matrix import RatingMatrix
+
+    # Build on the training split KNearest(seed=seed) holds out, or its hidden ratings leak into
+    # the similarities. KNearest.load_neighbors rejects a graph of any other split.
+    seed = int(sys.argv[1]) if len(sys.argv) > 1 else 0
+
+    start_time = time()
+    training_ratings, hidden_ratings = RatingMatrix.from_csv('../data/20k-users/training_ratings.csv').holdout(2, seed)
+    graph = NeighborGraph.build(training_ratings)
+    graph.save('../data/20k-users/user_neighbors.npz')
+    print 'Built %d edges on holdout seed %d in %.1fs' % (len(graph.neighbors), seed, time() - start_time)
@@ -0,0 +1,214 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from factor_store import FactorStore
+from Queue import Queue, Empty
+from threading import Thread, Lock
+from time import time, sleep
+import socket
+import sys
+import os
+import numpy
+
+class OnlineUpdater:
+    '''
+    Incremental factor updates from a stream of rating events. Every event is a ratings CSV line,
+    userId,movieId,rating,timestamp; sources (a followed file, a pipe or a local socket) run on
+    their own threads and feed one queue, and run() applies the events in arrival order.
+
+    An event only touches its own user and movie rows: a few SGD steps on that single rating,
+
+        x     <- x     - learning_rate * (residual * theta + lambda * x)
+        theta <- theta - learning_rate * (residual * x     + lambda * theta)
+
+    Unknown users and movies get a new row, started from the mean of the existing rows. Factors are
+    snapshotted as FactorStores every snapshot_interval seconds, which serving processes reopen.
+    '''
+    def __init__(self, movie_ids, movie_features, user_ids, user_thetas, regularized_factor=0.1, learning_rate=0.05,
+                 steps=5, snapshot_dir=None, snapshot_interval=5):
+        self.regularized_factor = regularized_factor
+        self.learning_rate = learning_rate
+        self.steps = steps
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_interval = snapshot_interval
+
+        self.movies = FactorRows(movie_ids, movie_features)
+        self.users = FactorRows(user_ids, user_thetas)
+
+        self.events = Queue()
+        self.lock = Lock()
+        self.applied = 0
+        self.last_snapshot = time()
+        self._threads = []
+
+    @classmethod
+    def from_store(cls, movie_store_filepath, user_store_filepath, **options):
+        movies, users = FactorStore(movie_store_filepath), FactorStore(user_store_filepath)
+        return cls(movies.ids, movies.factors, users.ids, users.factors, **options)
+
+    @classmethod
+    def from_trainer(cls, trainer, **options):
+        options.setdefault('regularized_factor', trainer.regularized_factor)
+        return cls(trainer.training_ratings.movie_ids, trainer.movie_features,
+                   trainer.training_ratings.user_ids, trainer.user_thetas, **options)
+
+    '''
+    Event sources, each read on a daemon thread
+    '''
+    def follow_file(self, filepath, from_end=True, poll_interval=0.2):
+        return self._start(self._follow, filepath, from_end, poll_interval)
+
+    def read_stream(self, stream=None):
+        return self._start(self._read_lines, stream or sys.stdin)
+
+    # address is a filesystem path for a Unix domain socket or a (host, port) pair for TCP
+    def listen(self, address):
+        if isinstance(address, str):
+            server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            if os.path.exists(address):
+                os.remove(address)
+        else:
+            server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind(address)
+        server.listen(8)
+        self._start(self._accept, server)
+        return server
+
+    def _start(self, target, *args):
+        thread = Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+        return thread
+
+    def _follow(self, filepath, from_end, poll_interval):
+        with open(filepath, 'rb') as infile:
+            if from_end:
+                infile.seek(0, os.SEEK_END)
+            partial = ''
+            while True:
+                line = infile.readline()
+                if not line:
+                    sleep(poll_interval)
+                    continue
+                partial += line
+                # A writer may be halfway through a line
+                if partial.endswith('\n'):
+                    self.push(partial)
+                    partial = ''
+
+    def _read_lines(self, stream):
+        for line in iter(stream.readline, ''):
+            self.push(line)
+
+    def _accept(self, server):
+        while True:
+            connection, address = server.accept()
+            self._start(self._read_lines, connection.makefile('rb'))
+
+    def push(self, line):
+        event = parse_event(line)
+        if event is not None:
+            self.events.put(event)
+
+    '''
+    Updates
+    '''
+    # Applies queued events until stop_after events were applied (or forever), snapshotting on the way
+    def run(self, stop_after=None, timeout=0.5):
+        while stop_after is None or self.applied < stop_after:
+            try:
+                user_id, movie_id, rating = self.events.get(timeout=timeout)
+                self.update(user_id, movie_id, rating)
+            except Empty:
+                pass
+
+            if self.snapshot_dir is not None and time() - self.last_snapshot >= self.snapshot_interval:
+                self.snapshot()
+
+        return self.applied
+
+    def update(self, user_id, movie_id, rating):
+        with self.lock:
+            m, u = self.movies.row(movie_id), self.users.row(user_id)
+            feature, theta = self.movies.factors[m], self.users.factors[u]
+            for step in range(0, self.steps):
+                residual = numpy.dot(feature, theta) - rating
+                dj_dfeature = residual * theta + self.regularized_factor * feature
+                dj_dtheta = residual * feature + self.regularized_factor * theta
+                feature -= self.learning_rate * dj_dfeature
+                theta -= self.learning_rate * dj_dtheta
+            self.applied += 1
+
+    def predict(self, user_id, movie_id):
+        with self.lock:
+            return float(numpy.dot(self.movies.factor(movie_id), self.users.factor(user_id)))
+
+    def snapshot(self):
+        with self.lock:
+            movie_ids, movie_features = self.movies.ids, self.movies.factors.copy()
+            user_ids, user_thetas = self.users.ids, self.users.factors.copy()
+        FactorStore.save(os.path.join(self.snapshot_dir, 'movie_features.bin'), movie_ids, movie_features)
+        FactorStore.save(os.path.join(self.snapshot_dir, 'user_features.bin'), user_ids, user_thetas)
+        self.last_snapshot = time()
+        return True
+
+class FactorRows:
+    '''
+    Growable factor matrix with an ID map. Capacity doubles when a new ID arrives, so appending a
+    row is amortized O(k).
+    '''
+    def __init__(self, ids, factors):
+        factors = numpy.array(factors, dtype=numpy.float64)
+        self._ids = numpy.array(ids, dtype=numpy.int64)
+        self._factors = factors
+        self.count = len(factors)
+        self.index = dict((str(row_id), i) for i, row_id in enumerate(self._ids.tolist()))
+
+    @property
+    def ids(self):
+        return self._ids[:self.count]
+
+    @property
+    def factors(self):
+        return self._factors[:self.count]
+
+    def factor(self, row_id):
+        return self._factors[self.index[str(row_id)]]
+
+    # Row number of an ID, appending a row when the ID is new
+    def row(self, row_id):
+        row_id = str(row_id)
+        i = self.index.get(row_id)
+        if i is not None:
+            return i
+
+        if self.count == len(self._factors):
+            capacity = max(2 * self.count, 16)
+            self._ids = numpy.resize(self._ids, capacity)
+            self._factors = numpy.resize(self._factors, (capacity, self._factors.shape[1]))
+
+        i = self.count
+        self._ids[i] = int(row_id)
+        self._factors[i] = numpy.mean(self._factors[:i], axis=0) if i > 0 else 0
+        self.index[row_id] = i
+        self.count += 1
+        return i
+
+# Returns (user_id, movie_id, rating) for a ratings CSV line, None for headers and malformed lines
+def parse_event(line):
+    fields = line.strip().split(',')
+    if len(fields) < 3 or not fields[0].isdigit() or not fields[1].isdigit():
+        return None
+    try:
+        return fields[0], fields[1], float(fields[2])
+    except ValueError:
+        return None
+
+if __name__ == '__main__':
+    # Follow new ratings piped in on stdin, snapshotting next to the 1k-users factors
+    updater = OnlineUpdater.from_store('../data/1k-users/movie_features.bin', '../data/1k-users/user_features.bin',
+                                       snapshot_dir='../data/1k-users')
+    updater.read_stream()
+    updater.run()
@@ -5,13 +5,16 @@ class Progress:
     def __init__(self, title, total_iteration):
         self.title = title
         self.total_iteration = total_iteration
-        self.interval = round(total_iteration / 100)
+        self.interval = max(1, round(total_iteration / 100))
 
     def describe(self, text):
         print u'\u25cc ' + text
 
+    # cost may be a function, it is only called when a line is printed
     def report(self, iteration, cost):
         if iteration % self.interval == 0:
+            if callable(cost):
+                cost = cost()
             percentage = round(100 * iteration / self.total_iteration)
             progress_bar = int(floor(percentage / 5)) * u'\u2588'
             check_box = u'\u2610'
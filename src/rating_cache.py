@@ -0,0 +1,92 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from hashlib import sha1
+from shutil import rmtree
+import json
+import sys
+import os
+import numpy
+
+class RatingCache:
+    '''
+    Sidecar binary cache of a parsed ratings file. Every RatingMatrix column is stored as its own
+    .npy file in <ratings file>.cache/ so later runs can memory-map them instead of parsing the CSV.
+    The cache is only trusted while the size, mtime and sampled hash of the source file match the
+    ones recorded when it was written.
+    '''
+    VERSION = 1
+    COLUMNS = ('user_ids', 'movie_ids', 'user_idx', 'movie_idx', 'ratings', 'timestamps', 'movie_order')
+
+    # Hash this many bytes from each end of the source file
+    SAMPLE_SIZE = 1 << 20
+
+    # Cache dirs a save already failed for
+    _unwritable = set()
+
+    def __init__(self, source_filepath):
+        self.source_filepath = source_filepath
+        self.dir = source_filepath + '.cache'
+
+    @property
+    def fingerprint(self):
+        stat = os.stat(self.source_filepath)
+        digest = sha1()
+        with open(self.source_filepath, 'rb') as infile:
+            digest.update(infile.read(self.SAMPLE_SIZE))
+            if stat.st_size > self.SAMPLE_SIZE:
+                infile.seek(max(self.SAMPLE_SIZE, stat.st_size - self.SAMPLE_SIZE))
+                digest.update(infile.read(self.SAMPLE_SIZE))
+
+        return {'version': self.VERSION, 'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': digest.hexdigest()}
+
+    def is_fresh(self):
+        try:
+            with open(os.path.join(self.dir, 'source.json')) as infile:
+                return json.load(infile) == self.fingerprint
+        except (IOError, ValueError):
+            return False
+
+    # Returns the memory-mapped columns as a dict, or None when the cache is missing or stale
+    def load(self):
+        if not self.is_fresh():
+            return None
+
+        columns = dict()
+        for name in self.COLUMNS:
+            path = os.path.join(self.dir, name + '.npy')
+            columns[name] = numpy.load(path, mmap_mode='r') if os.path.exists(path) else None
+        return columns
+
+    # Best-effort: a cache that can't be written (read-only data dir, full disk) is reported once and skipped
+    def save(self, matrix):
+        scratch_dir = '%s.tmp%d' % (self.dir, os.getpid())
+        try:
+            self._write(matrix, scratch_dir)
+            return True
+        except (IOError, OSError) as error:
+            rmtree(scratch_dir, ignore_errors=True)
+            if self.dir not in RatingCache._unwritable:
+                RatingCache._unwritable.add(self.dir)
+                sys.stderr.write('Skipping rating cache %s: %s\n' % (self.dir, error))
+            return False
+
+    def _write(self, matrix, scratch_dir):
+        fingerprint = self.fingerprint
+
+        # Write into a scratch directory and rename it over the old cache so readers never see half a cache
+        if os.path.exists(scratch_dir):
+            rmtree(scratch_dir)
+        os.makedirs(scratch_dir)
+
+        for name in self.COLUMNS:
+            column = getattr(matrix, name)
+            if column is not None:
+                numpy.save(os.path.join(scratch_dir, name + '.npy'), column)
+
+        with open(os.path.join(scratch_dir, 'source.json'), 'wt') as outfile:
+            json.dump(fingerprint, outfile)
+
+        if os.path.exists(self.dir):
+            rmtree(self.dir)
+        os.rename(scratch_dir, self.dir)
@@ -0,0 +1,204 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from hashlib import sha1
+import numpy
+
+from rating_cache import RatingCache
+from rating_reader import RatingReader
+
+class RatingMatrix:
+    '''
+    Compact rating storage. User and movie IDs are interned into contiguous int32 indices (in
+    ascending ID order) and every rating is a float32. Ratings are kept user-major (CSR), sorted by
+    movie within each user, together with a movie-major (CSC) permutation so that both "ratings of
+    user u" and "raters of movie m" are O(1) slices.
+    '''
+    def __init__(self, user_ids, movie_ids, user_idx, movie_idx, ratings, timestamps=None, movie_order=None):
+        # Sorted raw IDs, position i holds the ID interned as index i
+        self.user_ids = numpy.asarray(user_ids, dtype=numpy.int64)
+        self.movie_ids = numpy.asarray(movie_ids, dtype=numpy.int64)
+
+        # The rest of the code base keys users and movies by their string IDs
+        self.user_keys = [str(user_id) for user_id in self.user_ids]
+        self.movie_keys = [str(movie_id) for movie_id in self.movie_ids]
+        self.user_index = dict((key, i) for i, key in enumerate(self.user_keys))
+        self.movie_index = dict((key, i) for i, key in enumerate(self.movie_keys))
+
+        # Rating columns must already be in CSR order, from_columns sorts arbitrary input
+        self.user_idx = numpy.asarray(user_idx, dtype=numpy.int32)
+        self.movie_idx = numpy.asarray(movie_idx, dtype=numpy.int32)
+        self.ratings = numpy.asarray(ratings, dtype=numpy.float32)
+        self.timestamps = None if timestamps is None else numpy.asarray(timestamps, dtype=numpy.int64)
+
+        self.user_counts = numpy.bincount(self.user_idx, minlength=len(self.user_ids))
+        self.movie_counts = numpy.bincount(self.movie_idx, minlength=len(self.movie_ids))
+        self.user_sums = numpy.bincount(self.user_idx, weights=self.ratings, minlength=len(self.user_ids))
+        self.movie_sums = numpy.bincount(self.movie_idx, weights=self.ratings, minlength=len(self.movie_ids))
+        self.user_indptr = numpy.concatenate(([0], numpy.cumsum(self.user_counts)))
+        self.movie_indptr = numpy.concatenate(([0], numpy.cumsum(self.movie_counts)))
+
+        # Movie-major view: position p of the CSC arrays is position movie_order[p] of the CSR arrays
+        if movie_order is None:
+            movie_order = numpy.argsort(self.movie_idx, kind='mergesort')
+        self.movie_order = movie_order
+        self.column_user_idx = self.user_idx[self.movie_order]
+        self.column_ratings = self.ratings[self.movie_order]
+
+    @classmethod
+    def from_columns(cls, user_ids, movie_ids, ratings, timestamps=None):
+        unique_user_ids, user_idx = numpy.unique(numpy.asarray(user_ids, dtype=numpy.int64), return_inverse=True)
+        unique_movie_ids, movie_idx = numpy.unique(numpy.asarray(movie_ids, dtype=numpy.int64), return_inverse=True)
+
+        order = numpy.lexsort((movie_idx, user_idx))
+        ratings = numpy.asarray(ratings, dtype=numpy.float32)[order]
+        timestamps = None if timestamps is None else numpy.asarray(timestamps, dtype=numpy.int64)[order]
+        return cls(unique_user_ids, unique_movie_ids, user_idx[order], movie_idx[order], ratings, timestamps)
+
+    # Parsed columns are cached next to the CSV and memory-mapped on later reads
+    @classmethod
+    def from_csv(cls, rating_csv_filepath, use_cache=True, workers=1):
+        cache = RatingCache(rating_csv_filepath)
+        if use_cache:
+            columns = cache.load()
+            if columns is not None:
+                return cls(**columns)
+
+        matrix = cls.parse_csv(rating_csv_filepath, workers)
+        if use_cache:
+            cache.save(matrix)
+        return matrix
+
+    @classmethod
+    def parse_csv(cls, rating_csv_filepath, workers=1):
+        user_ids, movie_ids, ratings, timestamps = RatingReader(rating_csv_filepath, workers=workers).read()
+        return cls.from_columns(user_ids, movie_ids, ratings, timestamps)
+
+    def __len__(self):
+        return len(self.ratings)
+
+    '''
+    Row slices, returned as (other side's indices, ratings)
+    '''
+    def user_row(self, u):
+        lo, hi = self.user_indptr[u], self.user_indptr[u + 1]
+        return self.movie_idx[lo:hi], self.ratings[lo:hi]
+
+    def movie_column(self, m):
+        lo, hi = self.movie_indptr[m], self.movie_indptr[m + 1]
+        return self.column_user_idx[lo:hi], self.column_ratings[lo:hi]
+
+    '''
+    Dict-like views keyed by string IDs, for code written against {id: rating} dicts
+    '''
+    def ratings_of_user(self, user_id):
+        movie_idx, ratings = self.user_row(self.user_index[user_id])
+        return RatingRow(movie_idx, ratings, self.movie_keys, self.movie_index)
+
+    def raters_of_movie(self, movie_id):
+        user_idx, ratings = self.movie_column(self.movie_index[movie_id])
+        return RatingRow(user_idx, ratings, self.user_keys, self.user_index)
+
+    '''
+    Subsets share the ID maps of their parent, so indices stay comparable between them
+    '''
+    def select(self, mask):
+        timestamps = None if self.timestamps is None else self.timestamps[mask]
+        return RatingMatrix(self.user_ids, self.movie_ids, self.user_idx[mask], self.movie_idx[mask],
+                            self.ratings[mask], timestamps)
+
+    # Identifies which ratings a matrix holds, so artifacts built on one holdout split (a saved
+    # neighbor graph) can tell it apart from another split of the same file
+    @property
+    def fingerprint(self):
+        digest = sha1()
+        for column in (self.user_ids, self.movie_ids, self.user_idx, self.movie_idx):
+            digest.update(numpy.ascontiguousarray(column).tostring())
+        return digest.hexdigest()
+
+    # Movies as rows and users as columns. The CSC arrays are already movie-major with users sorted
+    # within each movie, so they are the CSR arrays of the transpose.
+    def transpose(self):
+        timestamps = None if self.timestamps is None else self.timestamps[self.movie_order]
+        return RatingMatrix(self.movie_ids, self.user_ids, self.movie_idx[self.movie_order], self.column_user_idx,
+                            self.column_ratings, timestamps)
+
+    # Pick count random ratings from every user who has at least that many ratings
+    def holdout_mask(self, count, seed=None):
+        random_keys = numpy.random.RandomState(seed).random_sample(len(self.ratings))
+        order = numpy.lexsort((random_keys, self.user_idx))
+        rank = numpy.arange(len(order)) - self.user_indptr[self.user_idx[order]]
+
+        mask = numpy.zeros(len(self.ratings), dtype=bool)
+        mask[order] = (rank < count) & (self.user_counts[self.user_idx[order]] >= count)
+        return mask
+
+    # Fold number (0 to count - 1) of every rating. Stratified folds deal each user's ratings out
+    # round-robin in random order, so every user is spread evenly over the folds; otherwise ratings
+    # are assigned by one global shuffle.
+    def fold_ids(self, count, seed=None, stratified=True):
+        random_state = numpy.random.RandomState(seed)
+        if not stratified:
+            return random_state.permutation(len(self.ratings)) % count
+
+        random_keys = random_state.random_sample(len(self.ratings))
+        order = numpy.lexsort((random_keys, self.user_idx))
+        rank = numpy.arange(len(order)) - self.user_indptr[self.user_idx[order]]
+
+        # Start every user at a random fold so users with few ratings don't all land in fold 0
+        offsets = random_state.randint(count, size=len(self.user_ids))
+        folds = numpy.empty(len(self.ratings), dtype=numpy.int64)
+        folds[order] = (rank + offsets[self.user_idx[order]]) % count
+        return folds
+
+    def holdout(self, count, seed=None):
+        mask = self.holdout_mask(count, seed)
+        return self.select(~mask), self.select(mask)
+
+class RatingRow:
+    '''
+    Read-only {id: rating} view over one row of a RatingMatrix. Indices are sorted, so lookups are
+    a binary search rather than a hash probe.
+    '''
+    def __init__(self, indices, values, keys, index):
+        self.indices = indices
+        self.values = values
+        self._keys = keys
+        self._index = index
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __iter__(self):
+        for i in self.indices:
+            yield self._keys[i]
+
+    def __contains__(self, key):
+        return self._position(key) is not None
+
+    def __getitem__(self, key):
+        position = self._position(key)
+        if position is None:
+            raise KeyError(key)
+        return float(self.values[position])
+
+    def get(self, key, default=None):
+        position = self._position(key)
+        if position is None:
+            return default
+        return float(self.values[position])
+
+    def keys(self):
+        return [self._keys[i] for i in self.indices]
+
+    def items(self):
+        return zip(self.keys(), self.values.tolist())
+
+    def _position(self, key):
+        i = self._index.get(key)
+        if i is None:
+            return None
+        position = self.indices.searchsorted(i)
+        if position < len(self.indices) and self.indices[position] == i:
+            return position
+        return None
@@ -0,0 +1,117 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from multiprocessing import Pool
+import os
+import numpy
+
+from source_file import compression_of, open_source
+
+# userId, movieId, rating, timestamp
+COLUMN_COUNT = 4
+
+# Parse complete lines of a ratings file into an (n, 4) float64 array, skipping any line that does
+# not start with a digit (the header) just like the csv.reader loops did
+def parse_rating_lines(text):
+    text = text.replace('\r', '').strip('\n')
+    if not text:
+        return numpy.empty((0, COLUMN_COUNT))
+
+    if not text[0].isdigit():
+        text = text.partition('\n')[2]
+
+    values = numpy.fromstring(text.replace('\n', ','), sep=',')
+    line_count = text.count('\n') + 1 if text else 0
+    if len(values) == line_count * COLUMN_COUNT:
+        return values.reshape(line_count, COLUMN_COUNT)
+
+    # Stray header or malformed lines inside the block, fall back to line by line parsing
+    rows = [line.split(',')[:COLUMN_COUNT] for line in text.split('\n') if line[:1].isdigit()]
+    return numpy.array(rows, dtype=numpy.float64).reshape(len(rows), COLUMN_COUNT)
+
+def split_columns(values):
+    return (values[:, 0].astype(numpy.int64), values[:, 1].astype(numpy.int64),
+            values[:, 2].astype(numpy.float32), values[:, 3].astype(numpy.int64))
+
+def concatenate_columns(blocks):
+    return tuple(numpy.concatenate([block[i] for block in blocks]) for i in range(0, COLUMN_COUNT))
+
+# Process pool entry point, parses one newline-aligned byte range into columns
+def read_byte_range(args):
+    rating_csv_filepath, chunk_size, start, end = args
+    reader = RatingReader(rating_csv_filepath, chunk_size)
+    return concatenate_columns([split_columns(values) for values in reader.blocks(start, end)])
+
+class RatingReader:
+    '''
+    Streams a ratings CSV in large buffered blocks. Every block is cut at its last newline and
+    parsed in one numpy.fromstring call, so no per-row Python objects are created.
+
+    With workers > 1 the file is split into newline-aligned byte ranges that are parsed by a
+    process pool and concatenated in file order. Compressed files (see source_file) are
+    decompressed on a background thread and always read sequentially.
+    '''
+    CHUNK_SIZE = 1 << 24
+
+    def __init__(self, rating_csv_filepath, chunk_size=CHUNK_SIZE, workers=1):
+        self.rating_csv_filepath = rating_csv_filepath
+        self.chunk_size = chunk_size
+        self.workers = workers
+
+    # Yields runs of complete lines, the last one may lack its trailing newline
+    def text_blocks(self, start=0, end=None):
+        with open_source(self.rating_csv_filepath, background=True) as infile:
+            if start > 0:
+                infile.seek(start)
+            position = start
+            remainder = ''
+            while end is None or position < end:
+                size = self.chunk_size if end is None else min(self.chunk_size, end - position)
+                chunk = infile.read(size)
+                if not chunk:
+                    break
+                position += len(chunk)
+
+                chunk = remainder + chunk
+                cut = chunk.rfind('\n') + 1
+                remainder = chunk[cut:]
+                yield chunk[:cut]
+
+            yield remainder
+
+    def blocks(self, start=0, end=None):
+        for text in self.text_blocks(start, end):
+            yield parse_rating_lines(text)
+
+    # Keeps the raw text of every rating line next to its parsed values, for writers that copy lines
+    def line_blocks(self):
+        for text in self.text_blocks():
+            lines = [line for line in text.replace('\r', '').split('\n') if line[:1].isdigit()]
+            yield lines, parse_rating_lines('\n'.join(lines))
+
+    # Split the file into count ranges that all start right after a newline
+    def byte_ranges(self, count):
+        size = os.path.getsize(self.rating_csv_filepath)
+        boundaries = [0]
+        with open(self.rating_csv_filepath, 'rb') as infile:
+            for i in range(1, count):
+                infile.seek(max(size * i // count, boundaries[-1]))
+                infile.readline()
+                boundaries.append(min(infile.tell(), size))
+        boundaries.append(size)
+
+        return [(boundaries[i], boundaries[i + 1]) for i in range(0, count) if boundaries[i] < boundaries[i + 1]]
+
+    # Returns user_ids, movie_ids, ratings, timestamps as separate columns
+    def read(self):
+        # Compressed streams cannot be split into byte ranges
+        if self.workers <= 1 or compression_of(self.rating_csv_filepath) is not None:
+            return read_byte_range((self.rating_csv_filepath, self.chunk_size, 0, None))
+
+        pool = Pool(self.workers)
+        try:
+            ranges = [(self.rating_csv_filepath, self.chunk_size, start, end) for start, end in self.byte_ranges(self.workers)]
+            return concatenate_columns(pool.map(read_byte_range, ranges))
+        finally:
+            pool.close()
+            pool.join()
@@ -0,0 +1,93 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from factor_store import FactorStore
+import numpy
+
+class Recommender:
+    '''
+    Top-N recommendations over a whole movie feature matrix. A user's theta is scored against every
+    movie with one matrix-vector product and the best N are picked with argpartition. Movies the
+    user already rated are masked through a seen index that is precomputed, in CSR form, from a
+    RatingMatrix.
+    '''
+    def __init__(self, movie_ids, movie_features, ratings=None, user_factors=None):
+        self.movie_ids = numpy.asarray(movie_ids, dtype=numpy.int64)
+        self.movie_keys = [str(movie_id) for movie_id in self.movie_ids.tolist()]
+        self.movie_features = movie_features
+
+        # Rows of add_movies, scored after movie_features so a memory-mapped base stays shared
+        self.added_features = numpy.zeros((0, movie_features.shape[1]), dtype=movie_features.dtype)
+
+        # Optional FactorStore of user preferences, lets recommend() take a bare user ID
+        self.user_factors = user_factors
+
+        self.seen_user_index = dict()
+        self.seen_indptr = numpy.zeros(1, dtype=numpy.int64)
+        self.seen_rows = numpy.zeros(0, dtype=numpy.int64)
+        if ratings is not None:
+            self.index_seen(ratings)
+
+    @classmethod
+    def from_store(cls, movie_store_filepath, ratings=None, user_store_filepath=None):
+        store = FactorStore(movie_store_filepath)
+        user_factors = None if user_store_filepath is None else FactorStore(user_store_filepath)
+        return cls(store.ids, store.factors, ratings, user_factors)
+
+    @classmethod
+    def from_trainer(cls, trainer):
+        return cls(trainer.training_ratings.movie_ids, trainer.movie_features, trainer.reducer.rating_matrix)
+
+    # New movies are appended as rows, so the seen index built so far stays valid. Their features go
+    # into added_features rather than a copy of movie_features, which would turn a from_store
+    # mapping into a private heap copy of the whole matrix on every catalog drop.
+    def add_movies(self, movie_ids, movie_features):
+        movie_ids = numpy.asarray(movie_ids, dtype=numpy.int64)
+        movie_features = numpy.asarray(movie_features, dtype=self.movie_features.dtype).reshape(len(movie_ids), -1)
+        self.movie_ids = numpy.concatenate((self.movie_ids, movie_ids))
+        self.movie_keys.extend(str(movie_id) for movie_id in movie_ids.tolist())
+        self.added_features = numpy.concatenate((self.added_features, movie_features))
+
+    # Translate every user's rated movies into rows of this movie matrix
+    def index_seen(self, ratings):
+        order = numpy.argsort(self.movie_ids)
+        position = numpy.searchsorted(self.movie_ids[order], ratings.movie_ids)
+        position = numpy.minimum(position, len(order) - 1)
+        known = self.movie_ids[order][position] == ratings.movie_ids
+        movie_rows = numpy.where(known, order[position], -1)
+
+        rows = movie_rows[ratings.movie_idx]
+        keep = rows >= 0
+        counts = numpy.bincount(ratings.user_idx[keep], minlength=len(ratings.user_ids))
+
+        self.seen_user_index = ratings.user_index
+        self.seen_indptr = numpy.concatenate(([0], numpy.cumsum(counts)))
+        self.seen_rows = rows[keep]
+
+    def seen(self, user_id):
+        u = self.seen_user_index.get(str(user_id))
+        if u is None:
+            return self.seen_rows[0:0]
+        return self.seen_rows[self.seen_indptr[u]:self.seen_indptr[u + 1]]
+
+    # Returns up to n (movie_id, predicted rating) pairs, best first. user is a User (anything with
+    # id and theta) or, when user factors were given, a user ID.
+    def recommend(self, user, n=10, exclude_seen=True):
+        if hasattr(user, 'theta'):
+            user_id, theta = user.id, user.theta
+        else:
+            user_id, theta = user, self.user_factors.factor(user)
+
+        theta = numpy.asarray(theta, dtype=self.movie_features.dtype)
+        scores = numpy.dot(self.movie_features, theta)
+        if len(self.added_features) > 0:
+            scores = numpy.concatenate((scores, numpy.dot(self.added_features, theta)))
+        if exclude_seen:
+            scores[self.seen(user_id)] = -numpy.inf
+
+        n = min(n, len(scores))
+        if n <= 0:
+            return []
+        top = numpy.argpartition(-scores, n - 1)[:n]
+        top = top[numpy.argsort(-scores[top])]
+        return [(self.movie_keys[i], float(scores[i])) for i in top if scores[i] != -numpy.inf]
@@ -0,0 +1,109 @@
+# Project: Recommender System
+# Author(s): Calvin Feng
+
+from Queue import Queue
+from threading import Thread
+import bz2
+import gzip
+import os
+
+# Python 2 has no lzma module in the standard library, .xz input needs backports.lzma
+try:
+    from backports import lzma
+except ImportError:
+    lzma = None
+
+EXTENSIONS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz'}
+MAGIC_BYTES = (('\x1f\x8b', 'gzip'), ('BZh', 'bz2'), ('\xfd7zXZ\x00', 'xz'))
+
+# Returns 'gzip', 'bz2', 'xz' or None, by file extension first and magic bytes second
+def compression_of(filepath):
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension in EXTENSIONS:
+        return EXTENSIONS[extension]
+
+    with open(filepath, 'rb') as infile:
+        head = infile.read(6)
+    for magic, compression in MAGIC_BYTES:
+        if head.startswith(magic):
+            return compression
+    return None
+
+# Open a data file for binary reading, decompressing it on the fly when needed. With background
+# set, decompression runs on its own thread in large blocks ahead of the reader.
+def open_source(filepath, background=False):
+    compression = compression_of(filepath)
+    if compression is None:
+        return open(filepath, 'rb')
+
+    if compression == 'gzip':
+        infile = gzip.open(filepath, 'rb')
+    elif compression == 'bz2':
+        infile = bz2.BZ2File(filepath, 'rb')
+    elif lzma is not None:
+        infile = lzma.LZMAFile(filepath, 'rb')
+    else:
+        raise IOError('%s is xz compressed, install backports.lzma to read it' % filepath)
+
+    if background:
+        return BackgroundReader(infile)
+    return infile
+
+class BackgroundReader:
+    '''
+    Read-only file wrapper that keeps a few blocks of the underlying (decompressing) file ready on
+    a queue. zlib and bz2 release the GIL while they inflate, so decompression overlaps with
+    whatever the caller does with the previous block.
+    '''
+    BLOCK_SIZE = 1 << 24
+
+    def __init__(self, infile, block_size=BLOCK_SIZE, depth=4):
+        self.infile = infile
+        self.block_size = block_size
+        self.closed = False
+
+        self._queue = Queue(depth)
+        self._buffer = ''
+        self._finished = False
+        self._thread = Thread(target=self._fill)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _fill(self):
+        try:
+            while not self.closed:
+                block = self.infile.read(self.block_size)
+                self._queue.put(block)
+                if not block:
+                    return
+        except Exception as error:
+            self._queue.put(error)
+
+    def read(self, size=-1):
+        while not self._finished and (size < 0 or len(self._buffer) < size):
+            block = self._queue.get()
+            if isinstance(block, Exception):
+                raise block
+            if not block:
+                self._finished = True
+            self._buffer += block
+
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+    def close(self):
+        self.closed = True
+        # Unblock the fill thread if it is waiting on a full queue
+        while self._thread.is_alive():
+            while not self._queue.empty():
+                self._queue.get()
+            self._thread.join(0.01)
+        self.infile.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -1,22 +1,33 @@
 # Project: Recommender System
 # Author(s): Calvin Feng
 
-from random import random, sample
+from random import random, Random
 from pdb import set_trace as debugger
 from math import sqrt
+import numpy
+
+# Pearson similarity needs at least this many co-rated movies to be considered significant
+MIN_CO_RATED_COUNT = 20
+
+EMPTY_POSITIONS = numpy.zeros(0, dtype=numpy.int64)
 
 class User:
-    def __init__(self, user_id, movie_ratings, preference_length, is_test_user=False):
+    def __init__(self, user_id, movie_ratings, preference_length, is_test_user=False, hidden_ratings=None, seed=None):
         self.id = user_id
         self.preference_length = preference_length
         self.theta = self.random_init(preference_length)
 
-        if is_test_user:
-            self.set_ratings(movie_ratings, 2)
+        if hidden_ratings is not None:
+            # Ratings were already split, e.g. by RatingMatrix.holdout
+            self.movie_ratings = movie_ratings
+            self.hidden_ratings = hidden_ratings
+        elif is_test_user:
+            self.set_ratings(movie_ratings, 2, seed)
         else:
-            self.set_ratings(movie_ratings, 0)
+            self.set_ratings(movie_ratings, 0, seed)
 
         self._baseline_rating = None
+        self._rated_movies = None
 
     def random_init(self, size):
         # Give User a bias term, which is 1
@@ -25,13 +36,14 @@ class User:
             preference_vector.append(random())
         return preference_vector
 
-    def set_ratings(self, movie_ratings, num_of_hidden_ratings):
+    # Hides num_of_hidden_ratings random ratings from a copy of movie_ratings; the caller's dict is
+    # left alone and a seed makes the pick reproducible
+    def set_ratings(self, movie_ratings, num_of_hidden_ratings, seed=None):
+        movie_ratings = dict(movie_ratings)
         hidden_ratings = dict()
         if len(movie_ratings) >= num_of_hidden_ratings:
-
-            random_keys = sample(movie_ratings, num_of_hidden_ratings)
-            for i in range(0, num_of_hidden_ratings):
-                key = random_keys[i]
+            random_keys = Random(seed).sample(sorted(movie_ratings), num_of_hidden_ratings)
+            for key in random_keys:
                 hidden_ratings[key] = movie_ratings.pop(key)
 
         self.movie_ratings = movie_ratings
@@ -47,26 +59,67 @@ class User:
 
         return self._baseline_rating
 
+    def update_rating(self, movie_id, rating):
+        self.movie_ratings[movie_id] = rating
+        self._baseline_rating = None
+        self._rated_movies = None
+
+    '''
+    Sorted co-rating arrays: the rated movie IDs as an ascending int64 array with the ratings aligned
+    to it, built once per user. Co-rated movies are then found with one vectorized binary search.
+    '''
+    @property
+    def rated_movies(self):
+        if self._rated_movies is None:
+            ratings = self.movie_ratings
+            if hasattr(ratings, 'indices'):
+                # RatingRow views are already sorted by movie ID
+                movie_ids = numpy.array([int(key) for key in ratings.keys()], dtype=numpy.int64)
+                values = numpy.asarray(ratings.values, dtype=numpy.float64)
+            else:
+                movie_ids = numpy.array([int(key) for key in ratings], dtype=numpy.int64)
+                values = numpy.array([float(ratings[key]) for key in ratings], dtype=numpy.float64)
+                order = numpy.argsort(movie_ids)
+                movie_ids, values = movie_ids[order], values[order]
+            self._rated_movies = (movie_ids, values)
+
+        return self._rated_movies
+
+    # Positions of the movies both users rated, in each user's rated_movies arrays
+    def co_rated(self, other_user):
+        movie_ids, other_movie_ids = self.rated_movies[0], other_user.rated_movies[0]
+        if len(movie_ids) > len(other_movie_ids):
+            other_positions, positions = intersect_sorted(other_movie_ids, movie_ids)
+            return positions, other_positions
+        return intersect_sorted(movie_ids, other_movie_ids)
+
     def sim(self, other_user):
         # Using Pearson correlation coefficient
-        user_correlation = 0
-        this_user_variance, other_user_variance = 0, 0
-        movies_seen_by_both = []
-        for movie_id in self.movie_ratings:
-            if other_user.movie_ratings.get(movie_id):
-                movies_seen_by_both.append(movie_id)
-
-        if len(movies_seen_by_both) >= 20:
-            for movie_id in movies_seen_by_both:
-                this_rating, other_rating = float(self.movie_ratings[movie_id]), float(other_user.movie_ratings[movie_id])
-                user_correlation += (this_rating - self.avg_rating)*(other_rating - other_user.avg_rating)
-                this_user_variance += (this_rating - self.avg_rating)**2
-                other_user_variance += (other_rating - other_user.avg_rating)**2
-            if this_user_variance == 0 or other_user_variance == 0:
-                # If one of the variances is zero, it's an undefined correlation
-                return 0
-            else:
-                return user_correlation/(sqrt(this_user_variance)*sqrt(other_user_variance))
-        else:
+        if len(self.movie_ratings) < MIN_CO_RATED_COUNT or len(other_user.movie_ratings) < MIN_CO_RATED_COUNT:
+            return 0
+
+        positions, other_positions = self.co_rated(other_user)
+        if len(positions) < MIN_CO_RATED_COUNT:
             # Statistically insignificant thus I return 0 for similarity
             return 0
+
+        this_deviation = self.rated_movies[1][positions] - self.avg_rating
+        other_deviation = other_user.rated_movies[1][other_positions] - other_user.avg_rating
+        this_user_variance = numpy.dot(this_deviation, this_deviation)
+        other_user_variance = numpy.dot(other_deviation, other_deviation)
+        if this_user_variance == 0 or other_user_variance == 0:
+            # If one of the variances is zero, it's an undefined correlation
+            return 0
+
+        user_correlation = numpy.dot(this_deviation, other_deviation)
+        return float(user_correlation/(sqrt(this_user_variance)*sqrt(other_user_variance)))
+
+# Positions of the common values of two sorted unique arrays, found by binary-searching every value of
+# the shorter one in the longer one
+def intersect_sorted(shorter, longer):
+    if len(longer) == 0:
+        return EMPTY_POSITIONS, EMPTY_POSITIONS
+
+    longer_positions = numpy.minimum(numpy.searchsorted(longer, shorter), len(longer) - 1)
+    positions = numpy.flatnonzero(longer[longer_positions] == shorter)
+    return positions, longer_positions[positions]